@@ -1,7 +1,8 @@
 # import gradio as gr
 import os
 
-from openai import OpenAI
+from http_clients import get_openai_client
+from llm_events import LLMCall, openai_usage
 from dotenv import load_dotenv
 
 import random
@@ -22,27 +23,44 @@ def print_llm_response(prompt):
     print(llm_response)
 
 
-def get_llm_response(prompt,api_key):
+def get_llm_response(prompt,api_key, cache=None):
     """This function takes as input a prompt, which must be a string enclosed in quotation marks,
     and passes it to OpenAI's GPT3.5 model. The function then saves the response of the model as
-    a string.
+    a string. When an LLMResponseCache is given, repeated prompts are answered from it.
     """
     try:
         if not isinstance(prompt, str):
             raise ValueError("Input must be a string enclosed in quotes.")
-        client = OpenAI(api_key=api_key)
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful but terse AI assistant who gets straight to the point.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.0,
-        )
+        model_name = "gpt-3.5-turbo-0125"
+        messages = [
+            {
+                "role": "system",
+                "content": "You are a helpful but terse AI assistant who gets straight to the point.",
+            },
+            {"role": "user", "content": prompt},
+        ]
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(model_name, messages, 0.0)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                LLMCall(model_name, cache="hit").finish()
+                return cached
+        client = get_openai_client(api_key)
+        call = LLMCall(model_name, cache=None if cache is None else "miss")
+        try:
+            completion = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0.0,
+            )
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        call.finish(*(openai_usage(completion) or ()))
         response = completion.choices[0].message.content
+        if cache_key is not None:
+            cache.set(cache_key, response, model_name)
         return response
     except TypeError as e:
         print("Error:", str(e))
@@ -65,14 +83,14 @@ def get_chat_completion(prompt, history):
     response = completion.choices[0].message.content
     return response
 
-def extract_company_name_and_job_name(job_description_text,api_key):
+def extract_company_name_and_job_name(job_description_text,api_key, cache=None):
     return get_llm_response(f"""Given the following job description, extract and return the company name and job title in the format CompanyName|JobName that is each there will be no spaces between the Words in the words in the
     CompanyName and the JobName, In the JobName each word will be the first Letter in upper case and the rest in lower case for example data scientist  will be written as DataScientist.
     if the company name is ABC and the job is data scientist the result should return ABC_DataScientist
 
 {job_description_text}
 
-Output the result in the specified format:""",api_key)
+Output the result in the specified format:""",api_key, cache=cache)
 
 
 if __name__ == "__main__" :
@@ -15,6 +15,15 @@ from abc import ABC, abstractmethod
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+import asyncio
+import inspect
+import random
+import threading
+import time
+import json
+from http_clients import get_openai_client, get_async_openai_client
+from prompt_builder import PromptBuilder
+from llm_events import LLMCall, openai_usage
 
 
 # Base class for LLM interaction
@@ -27,6 +36,359 @@ class LLMModel(ABC):
     def get_response(self, prompt, history=None, temperature=0.7):
         pass
 
+    async def aget_response(self, prompt, history=None, temperature=0.7):
+        """
+        Async sibling of get_response.
+
+        Providers with a native async client override this; the default runs the
+        blocking call on a worker thread so it can still be awaited concurrently.
+        """
+        return await asyncio.to_thread(self.get_response, prompt, history, temperature)
+
+    def add_usage_listener(self, listener):
+        """
+        Register ``listener(model_name, prompt_tokens, completion_tokens, cached_tokens)``,
+        called after every request whose token usage the provider reports; ``cached_tokens``
+        is the part of the prompt served from the provider's prompt cache. Hits of the local
+        response cache report nothing.
+        """
+        self.__dict__.setdefault("_usage_listeners", []).append(listener)
+
+    def remove_usage_listener(self, listener):
+        """
+        Unregister a listener added with add_usage_listener.
+        """
+        listeners = self.__dict__.get("_usage_listeners", [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def _report_usage(self, prompt_tokens, completion_tokens, cached_tokens=0):
+        for listener in list(self.__dict__.get("_usage_listeners", ())):
+            listener(self.model_name, prompt_tokens or 0, completion_tokens or 0, cached_tokens or 0)
+
+    def invalidate(self, prompt, history=None, temperature=None):
+        """
+        Forget the response to a request the caller rejected. Only caching wrappers keep
+        responses, so the default does nothing.
+        """
+
+    def stream_response(self, prompt, history=None, temperature=0.7):
+        """
+        Yield the response text in chunks as it is generated.
+
+        Providers with a streaming API override this; the default yields the whole
+        response of get_response as a single chunk.
+
+        The generator returns True once the provider confirms the response is complete,
+        and False when it ended early (error, length limit), so callers such as the
+        response cache can tell a finished response from a truncated one.
+        """
+        response = self.get_response(prompt, history=history, temperature=temperature)
+        if response is not None:
+            yield response
+        return response is not None
+
+    def get_structured_response(self, prompt, schema, history=None, temperature=0.01, schema_name="response"):
+        """
+        Get a response as a JSON object following ``schema``.
+
+        Providers with native structured output override this; the default appends the
+        schema to the prompt and parses the JSON object out of the text response.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            schema (dict): The JSON schema the response must follow.
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature for response randomness.
+            schema_name (str): Name of the schema, used by providers that require one.
+
+        Returns:
+            dict: The parsed response, or None if no JSON object could be parsed.
+        """
+        prompt = _schema_prompt(prompt, schema)
+        return _parse_json_object(self.get_response(prompt, history=history, temperature=temperature))
+
+    def invalidate_structured(self, prompt, schema, history=None, temperature=0.01):
+        """
+        Forget a structured response the caller rejected (for example one failing validation).
+        The default matches the text request get_structured_response sends.
+        """
+        self.invalidate(_schema_prompt(prompt, schema), history=history, temperature=temperature)
+
+    async def aget_structured_response(self, prompt, schema, history=None, temperature=0.01, schema_name="response"):
+        """
+        Async sibling of get_structured_response.
+        """
+        return await asyncio.to_thread(self.get_structured_response, prompt, schema, history, temperature, schema_name)
+
+
+def _schema_prompt(prompt, schema):
+    return f"{prompt}\n\nRespond only with a JSON object following this JSON schema:\n{json.dumps(schema)}"
+
+
+def _parse_json_object(response):
+    """
+    Parse the JSON object contained in a text response, ignoring code fences and prose around it.
+
+    Returns:
+        dict: The parsed object, or None if the response holds no valid JSON object.
+    """
+    if response is None:
+        return None
+    start, end = response.find("{"), response.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        payload = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+class LLMExecutor:
+    """
+    Runs LLM calls concurrently while bounding the number of requests in flight.
+    """
+
+    def __init__(self, max_concurrency=8):
+        """
+        Args:
+            max_concurrency (int): Maximum number of calls allowed to run at the same time.
+        """
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self):
+        # A semaphore is bound to the event loop it is used in, so recreate it per loop.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, call):
+        """
+        Run a single call under the concurrency bound.
+
+        Args:
+            call: An awaitable (e.g. model.aget_response(...)) or a zero-argument
+                callable, which is executed on a worker thread.
+
+        Returns:
+            The result of the call.
+        """
+        async with self._get_semaphore():
+            if inspect.isawaitable(call):
+                return await call
+            return await asyncio.to_thread(call)
+
+    async def gather(self, calls, return_exceptions=False):
+        """
+        Run many calls concurrently and return their results in input order.
+
+        Args:
+            calls (list): Awaitables or zero-argument callables.
+            return_exceptions (bool): Return exceptions in place of results instead of raising.
+
+        Returns:
+            list: The results, in the same order as ``calls``.
+        """
+        return await asyncio.gather(*(self.run(call) for call in calls), return_exceptions=return_exceptions)
+
+    def map(self, calls, return_exceptions=False):
+        """
+        Blocking entry point for synchronous code: runs ``gather`` on a fresh event loop.
+        """
+        return asyncio.run(self.gather(calls, return_exceptions=return_exceptions))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``capacity`` units per minute.
+
+    Reservations may drive the level below zero; the caller then waits for the
+    returned delay, which keeps concurrent callers in FIFO order without polling.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.capacity / 60.0)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        """
+        Take ``amount`` units from the bucket.
+
+        Returns:
+            float: Seconds to wait before the reserved units are actually available.
+        """
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            if self.level >= 0:
+                return 0.0
+            return -self.level * 60.0 / self.capacity
+
+    def adjust(self, amount):
+        """
+        Give back (positive) or take (negative) units after the real usage is known.
+        """
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimitScheduler:
+    """
+    Schedules requests against per-model requests-per-minute and tokens-per-minute
+    budgets, and retries rate-limited or transient failures with jittered exponential
+    backoff, honouring the provider's Retry-After header.
+    """
+
+    RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                        openai.InternalServerError)
+
+    def __init__(self, limits=None, max_retries=6, base_delay=1.0, max_delay=60.0, completion_tokens_estimate=500):
+        """
+        Args:
+            limits (dict): Mapping of model name to {"rpm": int, "tpm": int}; models without
+                limits are only retried, not throttled.
+            max_retries (int): Number of retries after the first attempt.
+            base_delay (float): Backoff delay in seconds of the first retry.
+            max_delay (float): Upper bound of a single backoff delay.
+            completion_tokens_estimate (int): Completion tokens reserved per request until
+                the actual usage is reported.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_tokens_estimate = completion_tokens_estimate
+        self._buckets = {}
+        self._lock = threading.Lock()
+        for model_name, model_limits in (limits or {}).items():
+            self.set_limits(model_name, **model_limits)
+
+    def set_limits(self, model_name, rpm=None, tpm=None):
+        """
+        Set the request and token budgets of a model.
+        """
+        with self._lock:
+            self._buckets[model_name] = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+
+    def estimate_tokens(self, messages):
+        """
+        Roughly estimate the tokens of a request (about four characters per token).
+        """
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+        return prompt_chars // 4 + self.completion_tokens_estimate
+
+    def _reserve(self, model_name, tokens):
+        requests_bucket, tokens_bucket = self._buckets.get(model_name, (None, None))
+        delay = 0.0
+        if requests_bucket is not None:
+            delay = max(delay, requests_bucket.reserve(1))
+        if tokens_bucket is not None:
+            delay = max(delay, tokens_bucket.reserve(tokens))
+        return delay
+
+    def _refund(self, model_name, tokens):
+        # A failed attempt consumed no tokens; its retry makes a new reservation
+        tokens_bucket = self._buckets.get(model_name, (None, None))[1]
+        if tokens_bucket is not None:
+            tokens_bucket.adjust(tokens)
+
+    def record_usage(self, model_name, estimated_tokens, actual_tokens):
+        """
+        Reconcile a reservation with the token usage reported by the provider.
+        """
+        tokens_bucket = self._buckets.get(model_name, (None, None))[1]
+        if tokens_bucket is not None and actual_tokens is not None:
+            tokens_bucket.adjust(estimated_tokens - actual_tokens)
+
+    def backoff_delay(self, attempt, error=None):
+        """
+        Delay before retry number ``attempt``: the server's Retry-After when given,
+        otherwise exponential backoff with full jitter.
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return min(self.max_delay, float(headers["retry-after-ms"]) / 1000.0)
+            if headers.get("retry-after"):
+                return min(self.max_delay, float(headers["retry-after"]))
+        except ValueError:
+            pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, model_name, messages, request):
+        """
+        Run a blocking request within the model's budgets, retrying retryable errors.
+
+        Args:
+            model_name (str): The model the request is sent to.
+            messages (list): The messages of the request, used to estimate its tokens.
+            request (callable): Zero-argument callable performing the request.
+
+        Returns:
+            The request's result.
+        """
+        estimated_tokens = self.estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(model_name, estimated_tokens)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                result = request()
+            except Exception as e:
+                self._refund(model_name, estimated_tokens)
+                if not isinstance(e, self.RETRYABLE_ERRORS) or attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                logging.warning(f"{model_name}: {type(e).__name__}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.record_usage(model_name, estimated_tokens, _total_tokens(result))
+            return result
+
+    async def acall(self, model_name, messages, request):
+        """
+        Async version of call; ``request`` returns an awaitable.
+        """
+        estimated_tokens = self.estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(model_name, estimated_tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                result = await request()
+            except Exception as e:
+                self._refund(model_name, estimated_tokens)
+                if not isinstance(e, self.RETRYABLE_ERRORS) or attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                logging.warning(f"{model_name}: {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.record_usage(model_name, estimated_tokens, _total_tokens(result))
+            return result
+
+
+def _total_tokens(completion):
+    usage = getattr(completion, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+# Shared by every OpenAIModel that is not given its own scheduler
+default_scheduler = RateLimitScheduler()
+
 
 # Gemini implementation of LLMModel using google.generativeai
 class GeminiModel(LLMModel):
@@ -66,14 +428,46 @@ class GeminiModel(LLMModel):
         Returns:
             str: The response from the model.
         """
+        call = LLMCall(self.model_name)
         try:
             # Use the Google generative AI library to generate content
-            response = self.model.generate_content(prompt)
+            response = call.counted(lambda: self.model.generate_content(prompt))()
+            call.finish(*self._record_usage(response))
             return response.text.strip()  # Returning the generated content text
         except Exception as e:
+            call.finish(error=e)
+            logging.error(f"An error occurred with the Gemini model: {e}")
+            return None
+
+    async def aget_response(self, prompt, history=None, temperature=0.7):
+        """
+        Async version of get_response using the native async Gemini call.
+        """
+        call = LLMCall(self.model_name)
+        try:
+            response = await call.counted(lambda: self.model.generate_content_async(prompt))()
+            call.finish(*self._record_usage(response))
+            return response.text.strip()
+        except Exception as e:
+            call.finish(error=e)
             logging.error(f"An error occurred with the Gemini model: {e}")
             return None
 
+    def _record_usage(self, response):
+        """
+        Report the token usage of a response to the usage listeners.
+
+        Returns:
+            tuple: The prompt, completion and cached tokens (zeros when not reported).
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return 0, 0, 0
+        tokens = (getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0,
+                  getattr(usage, "cached_content_token_count", 0) or 0)
+        self._report_usage(*tokens)
+        return tokens
+
 
 # OpenAI implementation of LLMModel
 class OpenAIModel(LLMModel):
@@ -81,30 +475,30 @@ class OpenAIModel(LLMModel):
     Class to interact with the OpenAI API using a client instance.
     """
 
-    def __init__(self, api_key, model_name='gpt-4o-mini'):
+    def __init__(self, api_key, model_name='gpt-4o-mini', scheduler=None):
         """
         Initialize the OpenAI model with the given API key and model name.
 
         Args:
             api_key (str): The OpenAI API key.
             model_name (str): The model to use, default is 'gpt-3.5-turbo'.
+            scheduler (RateLimitScheduler): Rate limit scheduler; the shared default_scheduler if None.
         """
-        import openai
         self.api_key = api_key
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
         self.model_name = model_name
+        self.scheduler = scheduler if scheduler is not None else default_scheduler
 
-    def get_response(self, prompt, history=None, temperature=0.99):
+    def _build_messages(self, prompt, history=None):
         """
-        Get the response from the OpenAI model for the given prompt.
+        Build the chat messages list sent to the API.
 
         Args:
             prompt (str): The prompt to send to the model.
             history (list): A list of previous messages (dictionaries with 'role' and 'content').
-            temperature (float): The temperature for response randomness.
 
         Returns:
-            str: The response from the model.
+            list: The messages list.
         """
         if history is None:
             history = []
@@ -121,17 +515,169 @@ class OpenAIModel(LLMModel):
 
         # Add current user prompt
         messages.append({"role": "user", "content": prompt})
-        print("@$"*4)
-        print("messages are:", messages)
+        return messages
+
+    def _record_usage(self, completion):
+        """
+        Report the token usage of a completion to the usage listeners.
+
+        Returns:
+            tuple: The prompt, completion and cached tokens (zeros when not reported).
+        """
+        tokens = openai_usage(completion)
+        if tokens is None:
+            return 0, 0, 0
+        self._report_usage(*tokens)
+        return tokens
+
+    def get_response(self, prompt, history=None, temperature=0.99):
+        """
+        Get the response from the OpenAI model for the given prompt.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature for response randomness.
+
+        Returns:
+            str: The response from the model.
+        """
+        messages = self._build_messages(prompt, history)
+        logging.debug(f"Sending {len(messages)} messages to {self.model_name}")
+        # Retries are handled by the scheduler, not by the client
+        client = self.client.with_options(max_retries=0)
+        call = LLMCall(self.model_name)
+        try:
+            completion = self.scheduler.call(self.model_name, messages, call.counted(lambda: client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature
+            )))
+            call.finish(*self._record_usage(completion))
+            response = completion.choices[0].message.content.strip()
+            return response
+        except Exception as e:
+            call.finish(error=e)
+            logging.error(f"An error occurred: {e}")
+            return None
+
+    async def aget_response(self, prompt, history=None, temperature=0.99):
+        """
+        Async version of get_response using the AsyncOpenAI client.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature for response randomness.
+
+        Returns:
+            str: The response from the model.
+        """
+        async_client = get_async_openai_client(self.api_key).with_options(max_retries=0)
+        messages = self._build_messages(prompt, history)
+        call = LLMCall(self.model_name)
         try:
-            completion = self.client.chat.completions.create(
+            completion = await self.scheduler.acall(self.model_name, messages, call.counted(lambda: async_client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
                 temperature=temperature
-            )
+            )))
+            call.finish(*self._record_usage(completion))
             response = completion.choices[0].message.content.strip()
             return response
         except Exception as e:
+            call.finish(error=e)
+            logging.error(f"An error occurred: {e}")
+            return None
+
+    def stream_response(self, prompt, history=None, temperature=0.99):
+        """
+        Stream the response of the OpenAI model, yielding text chunks as they arrive.
+
+        Closing the generator early closes the HTTP stream, so a caller that has read
+        what it needs stops paying for the rest of the completion.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature for response randomness.
+
+        Yields:
+            str: The next piece of the response.
+
+        Returns:
+            bool: True when the stream ended with finish_reason 'stop', False otherwise.
+        """
+        messages = self._build_messages(prompt, history)
+        client = self.client.with_options(max_retries=0)
+        call = LLMCall(self.model_name)
+        try:
+            stream = self.scheduler.call(self.model_name, messages, call.counted(lambda: client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )))
+        except Exception as e:
+            call.finish(error=e)
+            logging.error(f"An error occurred: {e}")
+            return False
+        tokens = (0, 0, 0)
+        error = None
+        finish_reason = None
+        try:
+            for chunk in stream:
+                # The last chunk carries the usage of the whole completion
+                if openai_usage(chunk) is not None:
+                    tokens = self._record_usage(chunk)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            error = e
+            logging.error(f"An error occurred while streaming: {e}")
+        finally:
+            stream.close()
+            call.finish(*tokens, error=error)
+        return error is None and finish_reason == "stop"
+
+    def get_structured_response(self, prompt, schema, history=None, temperature=0.01, schema_name="response"):
+        """
+        Get a response constrained to ``schema`` with OpenAI structured outputs.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            schema (dict): The JSON schema the response must follow (strict mode rules apply).
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature for response randomness.
+            schema_name (str): The name of the schema.
+
+        Returns:
+            dict: The parsed response, or None on error or refusal.
+        """
+        messages = self._build_messages(prompt, history)
+        client = self.client.with_options(max_retries=0)
+        call = LLMCall(self.model_name)
+        try:
+            completion = self.scheduler.call(self.model_name, messages, call.counted(lambda: client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": schema_name, "schema": schema, "strict": True},
+                },
+            )))
+            call.finish(*self._record_usage(completion))
+            message = completion.choices[0].message
+            if getattr(message, "refusal", None):
+                logging.error(f"The model refused the structured request: {message.refusal}")
+                return None
+            return json.loads(message.content)
+        except Exception as e:
+            call.finish(error=e)
             logging.error(f"An error occurred: {e}")
             return None
 
@@ -162,6 +708,17 @@ class CoverLetterGenerator:
         Returns:
             str: The generated cover letter.
         """
+        prompt = self._cover_letter_prompt(cv_text, job_description_text)
+        return self.ai_model.get_response(prompt, history=history)
+
+    async def agenerate_cover_letter(self, cv_text, job_description_text, history=None):
+        """
+        Async version of generate_cover_letter.
+        """
+        prompt = self._cover_letter_prompt(cv_text, job_description_text)
+        return await self.ai_model.aget_response(prompt, history=history)
+
+    def _cover_letter_prompt(self, cv_text, job_description_text):
         prompt = f"""Based on the provided job description and CV, write a concise, compelling, and personalized cover letter that highlights relevant skills and experiences.
 
 Job Description:
@@ -171,7 +728,7 @@ CV:
 {cv_text}
 
 Tailor the letter to the specific job requirements and showcase the candidate's match for the position. Mention specific accomplishments whenever possible. Keep the tone professional and precise. The letter should be no more than 4 sentences. Avoid unnecessary adjectives and emotive language. Finalize with 'Best regards,' followed by the applicant's name from the CV."""
-        return self.ai_model.get_response(prompt, history=history)
+        return prompt
 
     def create_critique(self, cover_letter, cv_text, job_description_text, history=None):
         """
@@ -186,6 +743,19 @@ Tailor the letter to the specific job requirements and showcase the candidate's
         Returns:
             tuple: A tuple containing the critique text and the overall grade.
         """
+        prompt = self._cover_letter_critique_prompt(cover_letter, cv_text, job_description_text)
+        response = self.ai_model.get_response(prompt, history=history)
+        return response, self._parse_cover_letter_critique(response)
+
+    async def acreate_critique(self, cover_letter, cv_text, job_description_text, history=None):
+        """
+        Async version of create_critique.
+        """
+        prompt = self._cover_letter_critique_prompt(cover_letter, cv_text, job_description_text)
+        response = await self.ai_model.aget_response(prompt, history=history)
+        return response, self._parse_cover_letter_critique(response)
+
+    def _cover_letter_critique_prompt(self, cover_letter, cv_text, job_description_text):
         prompt = f"""I need you to critique a cover letter submitted for an AI Developer role. Evaluate it based on the following criteria:
 
         1. **Relevance to the Job**  
@@ -213,9 +783,18 @@ Tailor the letter to the specific job requirements and showcase the candidate's
         {job_description_text}  
 
         Please ensure the grades and explanations are clearly structured, following the exact format specified."""
+        return prompt
 
-        response = self.ai_model.get_response(prompt, history=history)
+    def _parse_cover_letter_critique(self, response):
+        """
+        Validate a cover letter critique response and extract its overall grade.
 
+        Args:
+            response (str): The critique text returned by the model.
+
+        Returns:
+            float: The overall grade.
+        """
         if response is None:
             raise ValueError("Failed to get a response from the AI model.")
 
@@ -229,7 +808,7 @@ Tailor the letter to the specific job requirements and showcase the candidate's
         else:
             raise ValueError("Failed to extract overall grade from the critique.")
 
-        return response, grade
+        return grade
 
     def improve_cover_letter(self, cv_text, cover_letter, job_description_text, critique, overall_grade, history=None):
         """
@@ -282,19 +861,111 @@ Tailor the letter to the job requirements, highlighting relevant skills and expe
 
 
 # ai_interaction.py
+CV_CRITIQUE_GRADE_PATTERNS = {
+    "Relevance to the Job": r"#Relevance to the Job Grade\s*:\s*(\d+(\.\d+)?)#",
+    "Clarity and Structure": r"#Clarity and Structure Grade\s*:\s*(\d+(\.\d+)?)#",
+    "Skills Presentation": r"#Skills Presentation Grade\s*:\s*(\d+(\.\d+)?)#",
+    "Professionalism": r"#Professionalism Grade\s*:\s*(\d+(\.\d+)?)#",
+    "Overall": r"#Overall Grade\s*:\s*(\d+(\.\d+)?)#",
+}
+
+class CritiqueGradeParser:
+    """
+    Incremental parser of the grade markers of a streamed CV critique.
+
+    Chunks are fed as they arrive; each '#<Criterion> Grade: N#' marker is reported
+    through ``on_grade`` as soon as it is complete, without waiting for the rest of the text.
+    """
+
+    def __init__(self, on_grade=None):
+        """
+        Args:
+            on_grade (callable): Called with (criterion name, grade) for each new grade.
+        """
+        self.on_grade = on_grade
+        self.grades = {}
+        self._chunks = []
+        self._text = ""
+
+    @property
+    def text(self):
+        """
+        The critique text received so far.
+        """
+        return self._text
+
+    def feed(self, chunk):
+        """
+        Add a chunk of the critique and report the grades it completes.
+
+        Returns:
+            dict: The grades found in this chunk, by criterion name.
+        """
+        self._chunks.append(chunk)
+        self._text = "".join(self._chunks)
+        new_grades = {}
+        for name, pattern in CV_CRITIQUE_GRADE_PATTERNS.items():
+            if name in self.grades:
+                continue
+            match = re.search(pattern, self._text)
+            if match:
+                self.grades[name] = new_grades[name] = float(match.group(1))
+                if self.on_grade is not None:
+                    self.on_grade(name, self.grades[name])
+        return new_grades
+
+
+# (section title, grade label) of each criterion of the CV critique, in prompt order
+CV_CRITIQUE_CRITERIA = [
+    ("Relevance to the Job", "Relevance to the Job"),
+    ("Clarity and Structure", "Clarity and Structure"),
+    ("Skills Presentation", "Skills Presentation"),
+    ("Professionalism", "Professionalism"),
+    ("Reliability & Factual Accuracy", "Reliability"),
+    ("Overall Impression", "Overall"),
+]
+
+# JSON schema of a structured CV critique: one typed grade and explanation per criterion
+CV_CRITIQUE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{
+            label: {
+                "type": "object",
+                "properties": {"critique": {"type": "string"}, "grade": {"type": "number"}},
+                "required": ["critique", "grade"],
+                "additionalProperties": False,
+            }
+            for _, label in CV_CRITIQUE_CRITERIA
+        },
+        "Actionable Feedback": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": [label for _, label in CV_CRITIQUE_CRITERIA] + ["Actionable Feedback"],
+    "additionalProperties": False,
+}
+
+
 class CVGenerator:
     """
     Class to generate and improve CVs using any LLM model.
     """
 
-    def __init__(self, ai_model):
+    def __init__(self, ai_model, critique_mode="text", repair_model=None):
         """
         Initialize with an instance of LLMModel.
 
         Args:
             ai_model (LLMModel): The LLM model to use for generation.
+            critique_mode (str): "text" parses the grades out of the critique text; "structured"
+                asks for a JSON critique with typed grades and falls back to "text" if it is invalid.
+            repair_model (LLMModel): Small model asked to recover grades missing from a critique
+                from the critique text alone; ai_model is used if None.
         """
+        if critique_mode not in ("text", "structured"):
+            raise ValueError(f"Unknown critique mode: {critique_mode}")
         self.ai_model = ai_model
+        self.critique_mode = critique_mode
+        self.repair_model = repair_model if repair_model is not None else ai_model
 
     def generate_cv(self, cv_content, job_description_text, original_cv, history=None):
         """
@@ -308,6 +979,17 @@ class CVGenerator:
         Returns:
             str: The improved CV content.
         """
+        prompt = self._cv_prompt(cv_content, job_description_text, original_cv)
+        return self.ai_model.get_response(prompt, history=history)
+
+    async def agenerate_cv(self, cv_content, job_description_text, original_cv, history=None):
+        """
+        Async version of generate_cv.
+        """
+        prompt = self._cv_prompt(cv_content, job_description_text, original_cv)
+        return await self.ai_model.aget_response(prompt, history=history)
+
+    def _cv_prompt(self, cv_content, job_description_text, original_cv):
         prompt = f"""
         Review and improve the current CV content based on the original CV and the provided job description. Focus on the following:
 
@@ -346,8 +1028,7 @@ class CVGenerator:
         **Job Description**:  
         {job_description_text}  
         """
-
-        return self.ai_model.get_response(prompt, history=history)
+        return prompt
 
     def create_critique(self, cv_content, original_cv, job_description_text, history=None):
         """
@@ -363,7 +1044,113 @@ class CVGenerator:
             tuple: A tuple containing the critique text and the overall grade.
         """
         print(cv_content)
-        prompt = f"""Provide a detailed critique of the following CV based on these criteria:
+        prompt = self._cv_critique_prompt(cv_content, original_cv, job_description_text)
+        if self.critique_mode == "structured":
+            structured_prompt = self._structured_critique_prompt(prompt)
+            payload = self.ai_model.get_structured_response(
+                structured_prompt, CV_CRITIQUE_SCHEMA, history=history, temperature=0.01, schema_name="cv_critique")
+            result = self._structured_critique_result(payload)
+            if result is not None:
+                return result
+            # Not replayed from the cache on the next run
+            self.ai_model.invalidate_structured(structured_prompt, CV_CRITIQUE_SCHEMA, history=history, temperature=0.01)
+        response = self.ai_model.get_response(prompt, history=history, temperature=0.01)
+        return self._complete_critique(response, prompt, history)
+
+    def stream_critique(self, cv_content, original_cv, job_description_text, history=None, on_grade=None,
+                        stop_when=None):
+        """
+        Streaming version of create_critique in the text mode.
+
+        Grades are reported through ``on_grade`` as soon as their marker has streamed in, and
+        ``stop_when`` can end the stream early (for example once the overall grade is known
+        and good enough), in which case the critique text is truncated at that point.
+
+        Args:
+            cv_content (str): The content of the current version of the CV.
+            original_cv (str): The original, full text of the CV.
+            job_description_text (str): The job description text.
+            history (list): Conversation history.
+            on_grade (callable): Called with (criterion name, grade) for each grade as it arrives.
+            stop_when (callable): Called with the grades received so far after each new grade;
+                returning True stops reading the stream.
+
+        Returns:
+            tuple: The critique text, the overall grade and the per-criterion grades.
+        """
+        prompt = self._cv_critique_prompt(cv_content, original_cv, job_description_text)
+        parser = CritiqueGradeParser(on_grade)
+        stream = self.ai_model.stream_response(prompt, history=history, temperature=0.01)
+        try:
+            for chunk in stream:
+                if parser.feed(chunk) and stop_when is not None and stop_when(dict(parser.grades)):
+                    break
+        finally:
+            stream.close()
+        return self._complete_critique(parser.text or None, prompt, history)
+
+    def _complete_critique(self, response, prompt, history=None):
+        """
+        Extract the grades of a text critique, repairing or regenerating it when grades are missing.
+
+        Returns:
+            tuple: The critique text, the overall grade and the per-criterion grades.
+        """
+        grades_res, missing = self._extract_grades(response)
+        if missing:
+            # Recover the missing grades from the critique text before paying for a new critique
+            repair_prompt = self._grade_repair_prompt(response, missing)
+            repair = self.repair_model.get_response(repair_prompt, temperature=0.0)
+            response, grades_res, missing = self._merge_repaired_grades(response, grades_res, missing, repair)
+            if missing:
+                self.repair_model.invalidate(repair_prompt, temperature=0.0)
+        if missing:
+            logging.warning(f"Grade repair failed for {missing}, regenerating the critique.")
+            # The rejected critique must not be served again, now or on a rerun
+            self.ai_model.invalidate(prompt, history=history, temperature=0.01)
+            response = self.ai_model.get_response(prompt, history=history, temperature=0.01)
+            grades_res, missing = self._extract_grades(response)
+            if missing:
+                self.ai_model.invalidate(prompt, history=history, temperature=0.01)
+                raise ValueError(f"Failed to extract {missing[0]} grade.")
+        return self._finalize_critique(response, grades_res)
+
+    async def acreate_critique(self, cv_content, original_cv, job_description_text, history=None):
+        """
+        Async version of create_critique.
+        """
+        prompt = self._cv_critique_prompt(cv_content, original_cv, job_description_text)
+        if self.critique_mode == "structured":
+            structured_prompt = self._structured_critique_prompt(prompt)
+            payload = await self.ai_model.aget_structured_response(
+                structured_prompt, CV_CRITIQUE_SCHEMA, history=history, temperature=0.01, schema_name="cv_critique")
+            result = self._structured_critique_result(payload)
+            if result is not None:
+                return result
+            # Not replayed from the cache on the next run
+            self.ai_model.invalidate_structured(structured_prompt, CV_CRITIQUE_SCHEMA, history=history, temperature=0.01)
+        response = await self.ai_model.aget_response(prompt, history=history, temperature=0.01)
+        grades_res, missing = self._extract_grades(response)
+        if missing:
+            # Recover the missing grades from the critique text before paying for a new critique
+            repair_prompt = self._grade_repair_prompt(response, missing)
+            repair = await self.repair_model.aget_response(repair_prompt, temperature=0.0)
+            response, grades_res, missing = self._merge_repaired_grades(response, grades_res, missing, repair)
+            if missing:
+                self.repair_model.invalidate(repair_prompt, temperature=0.0)
+        if missing:
+            logging.warning(f"Grade repair failed for {missing}, regenerating the critique.")
+            # The rejected critique must not be served again, now or on a rerun
+            self.ai_model.invalidate(prompt, history=history, temperature=0.01)
+            response = await self.ai_model.aget_response(prompt, history=history, temperature=0.01)
+            grades_res, missing = self._extract_grades(response)
+            if missing:
+                self.ai_model.invalidate(prompt, history=history, temperature=0.01)
+                raise ValueError(f"Failed to extract {missing[0]} grade.")
+        return self._finalize_critique(response, grades_res)
+
+    def _cv_critique_prompt(self, cv_content, original_cv, job_description_text):
+        instructions = """Provide a detailed critique of the following CV based on these criteria:
 
        1. **Relevance to the Job** 
           - Does the CV emphasize skills and experiences directly aligned with the job description? 
@@ -404,65 +1191,161 @@ class CVGenerator:
        - Ensure each grade follows the specified format **#Criterion Name Grade: NUMBER##** for criteria grades, and **#Overall Grade: NUMBER.#** for the overall impression. 
        - Provide actionable feedback, especially when there are gaps in certain areas (e.g., forensic research) that the candidate can potentially fill with **transferable skills**.
        - Be mindful of **rare skills** (such as forensic research) not always being present in candidates’ CVs, and instead focus on **how the candidate’s expertise** in other areas could contribute to the role.
+       - The CV to critique is the **Current CV Version**, given last.
 
-       **Inputs**:
+       Ensure consistency and provide all grades using the required format. Keeping grades using the required format is very important.
 
-       **Current CV Version**: 
-       {cv_content} 
-       
-       **Original CV Version**:
-        {original_cv}
+       **Inputs**:"""
+        # The current CV is the only part that changes between iterations, so it goes last
+        return (PromptBuilder(instructions)
+                .static("Original CV Version", original_cv)
+                .static("Job Description", job_description_text)
+                .variable("Current CV Version", cv_content)
+                .build())
 
-       **Job Description**: 
-       {job_description_text} 
+    def _structured_critique_prompt(self, prompt):
+        return prompt + """
 
-       Ensure consistency and provide all grades using the required format. Keeping grades using the required format is very important."""
+       **Output format**: return the critique as JSON. For each criterion put the explanation in "critique"
+       and the grade, a number from 0 to 10, in "grade"; do not repeat the #...# grade markers in the text.
+       List the actionable feedback items in "Actionable Feedback"."""
 
-        response = self.ai_model.get_response(prompt, history=history, temperature=0.01)
+    def _validate_structured_critique(self, payload):
+        """
+        Check a structured critique against CV_CRITIQUE_SCHEMA and the grade range.
+
+        Args:
+            payload (dict): The parsed JSON critique.
+
+        Returns:
+            list: The problems found; empty if the critique is valid.
+        """
+        if not isinstance(payload, dict):
+            return ["the critique is not a JSON object"]
+        errors = []
+        for _, label in CV_CRITIQUE_CRITERIA:
+            entry = payload.get(label)
+            if not isinstance(entry, dict):
+                errors.append(f"'{label}' is missing")
+                continue
+            grade = entry.get("grade")
+            if isinstance(grade, bool) or not isinstance(grade, (int, float)) or not 0 <= grade <= 10:
+                errors.append(f"'{label}' grade {grade!r} is not a number from 0 to 10")
+            if not isinstance(entry.get("critique"), str):
+                errors.append(f"'{label}' critique is not a string")
+        feedback = payload.get("Actionable Feedback", [])
+        if not isinstance(feedback, list) or not all(isinstance(item, str) for item in feedback):
+            errors.append("'Actionable Feedback' is not a list of strings")
+        return errors
+
+    def _render_structured_critique(self, payload):
+        """
+        Render a structured critique in the text format of the critique prompt, so the
+        saved reports and the critique parsers see the same layout in both modes.
+        """
+        lines = []
+        for number, (title, label) in enumerate(CV_CRITIQUE_CRITERIA, start=1):
+            entry = payload[label]
+            lines.append(f"**{number}. {title}**")
+            lines.append(f"- {entry['critique'].strip()}")
+            lines.append(f"- Grade: **#{label} Grade: {float(entry['grade']):g}#**")
+            lines.append("")
+        lines.append("**Actionable Feedback**:")
+        lines.extend(f"- {item.strip()}" for item in payload.get("Actionable Feedback", []))
+        return "\n".join(lines)
+
+    def _structured_critique_result(self, payload):
+        """
+        Validate a structured critique and convert it to the create_critique result.
+
+        Returns:
+            tuple: The critique text, the overall grade and the per-criterion grades, or None
+            if the critique is invalid and the text mode should be used instead.
+        """
+        errors = self._validate_structured_critique(payload)
+        if errors:
+            logging.warning(f"Invalid structured critique ({'; '.join(errors)}), falling back to the text critique.")
+            return None
+        grades_res = {name: float(payload[name]["grade"]) for name in CV_CRITIQUE_GRADE_PATTERNS}
+        return self._render_structured_critique(payload), grades_res["Overall"], grades_res
+
+    def _grade_repair_prompt(self, response, missing):
+        grade_lines = "\n".join(f"#{name} Grade: NUMBER#" for name in missing)
+        return f"""The CV critique below is missing the grade of some criteria. Based only on the critique text,
+give the grade from 0 to 10 that the critique assigns to each of these criteria, one per line, in exactly
+this format and with nothing else:
+{grade_lines}
+
+**Critique**:
+{response}"""
+
+    def _merge_repaired_grades(self, response, grades_res, missing, repair):
+        """
+        Merge the grades returned by the repair call into a critique.
+
+        Args:
+            response (str): The critique text.
+            grades_res (dict): The grades already extracted from the critique.
+            missing (list): The criteria whose grade is missing.
+            repair (str): The response of the repair call.
 
+        Returns:
+            tuple: The critique text with the recovered grade lines appended, the merged grades
+            and the criteria still missing.
+        """
+        if repair is None:
+            return response, grades_res, missing
+        grades_res = dict(grades_res)
+        recovered = []
+        still_missing = []
+        for name in missing:
+            match = re.search(CV_CRITIQUE_GRADE_PATTERNS[name], repair)
+            if match:
+                grades_res[name] = float(match.group(1))
+                recovered.append(f"#{name} Grade: {match.group(1)}#")
+            else:
+                still_missing.append(name)
+        if recovered:
+            response = response + "\n\n" + "\n".join(recovered)
+        return response, grades_res, still_missing
+
+    def _extract_grades(self, response):
+        """
+        Extract the per-criterion grades from a CV critique.
+
+        Args:
+            response (str): The critique text returned by the model.
+
+        Returns:
+            tuple: A dictionary of the grades found and a list of the criteria whose grade is missing.
+        """
         if response is None:
             raise ValueError("Failed to get a response from the AI model.")
 
         # Adjusted regular expression to allow flexibility in spaces and format
         print(response)
         print("?" * 100)
-        grades = {
-            "Relevance to the Job": r"#Relevance to the Job Grade\s*:\s*(\d+(\.\d+)?)#",
-            "Clarity and Structure": r"#Clarity and Structure Grade\s*:\s*(\d+(\.\d+)?)#",
-            "Skills Presentation": r"#Skills Presentation Grade\s*:\s*(\d+(\.\d+)?)#",
-            "Professionalism": r"#Professionalism Grade\s*:\s*(\d+(\.\d+)?)#",
-            "Overall": r"#Overall Grade\s*:\s*(\d+(\.\d+)?)#",
-        }
-        flag = False
         grades_res = {}
-        for name, pattern in grades.items():
-            print(name)
+        missing = []
+        for name, pattern in CV_CRITIQUE_GRADE_PATTERNS.items():
             match = re.search(pattern, response)
-
-            if not match:
-                flag = True
+            if match:
+                grades_res[name] = float(match.group(1))
             else:
-                grades_res[name] = float(re.search(grades[name], response).group(1))
-                # raise ValueError(f"Failed to extract {name} grade.")
-        if flag:
-            response = self.ai_model.get_response(prompt, history=history, temperature=0.01)
-
-            if response is None:
-                raise ValueError("Failed to get a response from the AI model.")
-
-            # Adjusted regular expression to allow flexibility in spaces and format
+                missing.append(name)
+        return grades_res, missing
 
-            for name, pattern in grades.items():
-                print(name)
-                print(response)
-                match = re.search(pattern, response)
-                print(float(re.search(grades[name], response).group(1)))
-                grades_res[name] = float(re.search(grades[name], response).group(1))
-                if not match:
-                    raise ValueError(f"Failed to extract {name} grade.")
+    def _finalize_critique(self, response, grades_res):
+        """
+        Extract the overall grade of a validated critique.
 
-        grade = float(re.search(grades["Overall"], response).group(1))
+        Args:
+            response (str): The critique text.
+            grades_res (dict): The per-criterion grades.
 
+        Returns:
+            tuple: The critique text, the overall grade and the per-criterion grades.
+        """
         match = re.search(r"#Overall Grade\s*[:\-]?\s*(\d+(\.\d+)?)\s*#", response)
         if match:
             grade = float(match.group(1))
@@ -470,5 +1353,3 @@ class CVGenerator:
             raise ValueError("Failed to extract overall grade from the critique.")
         print("grades_res",grades_res)
         return response, grade,grades_res
- 
- 
@@ -1,9 +1,15 @@
 # basic_iterative.py
-import  pandas as pd
-import os
 from ExtractCompanyNameJob import extract_company_name_and_job_name
+from ai_interaction import LLMExecutor, CV_CRITIQUE_GRADE_PATTERNS
+from grade_log import GradeLog
+from budget import BudgetController
+from prompt_builder import PromptBuilder
+from cv_patch import CV_PATCH_INSTRUCTIONS, CV_PATCH_SCHEMA, CVPatchError, apply_cv_patch
+from llm_events import llm_stage
 class BasicIterativeAgent:
-    def __init__(self, cover_letter_gen, max_iterations=4, improvement_threshold=-0.5):
+    def __init__(self, cover_letter_gen, max_iterations=4, improvement_threshold=-0.5, history_window=None,
+                 history_token_budget=None, reset_history_per_run=False, stream_critique=False, num_candidates=1,
+                 budget=None, grade_log=None, revision_mode="full"):
         """
         Initialize the BasicIterativeAgent with a CoverLetterGenerator and hyperparameters.
 
@@ -11,10 +17,42 @@ class BasicIterativeAgent:
             cover_letter_gen (CoverLetterGenerator): The cover letter generator.
             max_iterations (int): The maximum number of iterations to perform.
             improvement_threshold (float): The threshold for stopping when no significant improvement is made.
+            history_window (int): Keep only the most recent messages in the history, at least 2;
+                None keeps all.
+            history_token_budget (int): Drop the oldest messages once the history exceeds this
+                many (estimated) tokens; None means no budget. The last two messages are kept
+                even above the budget, so it should fit a CV plus the formatting prompt.
+            reset_history_per_run (bool): Start each improve_cv and generate_cover_letter call with
+                an empty history instead of carrying over earlier runs.
+            stream_critique (bool): Stream the CV critiques and stop reading as soon as the
+                overall grade reaches the satisfactory grade.
+            num_candidates (int): Number of improved CVs generated and critiqued concurrently in
+                each iteration of improve_cv; the best graded one is kept.
+            budget (BudgetController): Controller stopping improve_cv when the next round would
+                exceed its token, cost or time budget or is not expected to pay off; if None, an
+                unlimited one only reports the usage, cost and prompt-cache hit rate of each run.
+            grade_log (GradeLog): Log the critique grades are appended to; the default
+                Output/Grades/grades.sqlite if None.
+            revision_mode (str): "full" has the model re-emit the whole CV in each iteration;
+                "patch" asks for section-scoped edits applied locally, falling back to a full
+                revision when the edits cannot be applied.
         """
+        if history_window is not None and history_window < 2:
+            raise ValueError(f"history_window must be at least 2, got {history_window}")
+        if revision_mode not in ("full", "patch"):
+            raise ValueError(f"Unknown revision mode: {revision_mode}")
         self.cover_letter_gen = cover_letter_gen
         self.max_iterations = max_iterations
         self.improvement_threshold = improvement_threshold
+        self.history_window = history_window
+        self.history_token_budget = history_token_budget
+        self.reset_history_per_run = reset_history_per_run
+        self.stream_critique = stream_critique
+        self.num_candidates = num_candidates
+        self.executor = LLMExecutor(max_concurrency=num_candidates)
+        self.budget = budget if budget is not None else BudgetController()
+        self.grade_log = grade_log if grade_log is not None else GradeLog()
+        self.revision_mode = revision_mode
         self.history = []
         self.grades = []
 
@@ -39,6 +77,8 @@ CV:
 {cv_text}
 
 Tailor the letter to the specific job requirements and showcase the candidate's match for the position. Mention specific accomplishments. Keep the tone professional and precise. The letter should be no more than 4 sentences. Avoid unnecessary adjectives and emotive language."""
+        if self.reset_history_per_run:
+            self.clear_history()
         cover_letter = self.cover_letter_gen.generate_cover_letter(cv_text, job_description_text, history=self.history)
         self._add_to_history("user", cover_letter)
         self._add_to_history("assistant", cover_letter)
@@ -53,6 +93,98 @@ Tailor the letter to the specific job requirements and showcase the candidate's
             content (str): The content of the message.
         """
         self.history.append({"role": role, "content": content})
+        self._trim_history()
+
+    def _trim_history(self):
+        """
+        Apply the history window and token budget, dropping the oldest messages first.
+
+        The two most recent messages are always kept: the formatting step sends the
+        enforcement prompt with the history and relies on the revised CV just before it.
+        """
+        if self.history_window is not None and len(self.history) > self.history_window:
+            del self.history[:len(self.history) - max(self.history_window, 2)]
+        if self.history_token_budget is not None:
+            # Rough estimate of about four characters per token
+            tokens = sum(len(message["content"] or "") // 4 for message in self.history)
+            while len(self.history) > 2 and tokens > self.history_token_budget:
+                tokens -= len(self.history.pop(0)["content"] or "") // 4
+
+    def _critique_cv(self, cv_content, original_cv, job_description_text):
+        """
+        Critique the current CV, streaming the critique when stream_critique is set.
+
+        The critique prompt carries everything it grades, so it is sent without the
+        conversation history. The messages then start with the same instructions, original
+        CV and job description in every iteration, a prefix the provider's prompt cache can reuse.
+
+        Returns:
+            tuple: The critique text, the overall grade and the per-criterion grades.
+        """
+        with llm_stage("critique"):
+            if not self.stream_critique:
+                return self.cover_letter_gen.create_critique(cv_content, original_cv, job_description_text)
+            # A satisfactory overall grade ends the run, so the rest of the critique is not needed
+            # once every grade has been read
+            return self.cover_letter_gen.stream_critique(
+                cv_content, original_cv, job_description_text,
+                on_grade=lambda name, grade: print(f"{name} Grade: {grade}"),
+                stop_when=lambda grades: all(name in grades for name in CV_CRITIQUE_GRADE_PATTERNS)
+                and grades["Overall"] >= 9)
+
+    def _revise_cv(self, improvement_prompt, cv_content):
+        """
+        Produce the next version of the CV, as edits to the current one in the patch mode.
+
+        Returns:
+            str: The revised CV, or None if the model did not respond.
+        """
+        ai_model = self.cover_letter_gen.ai_model
+        with llm_stage("revise"):
+            if self.revision_mode == "patch":
+                patch_prompt = improvement_prompt + CV_PATCH_INSTRUCTIONS
+                patch = ai_model.get_structured_response(patch_prompt, CV_PATCH_SCHEMA, temperature=0.99,
+                                                         schema_name="cv_patch")
+                try:
+                    if patch is None:
+                        raise CVPatchError("No patch returned by the model.")
+                    revised_cv = apply_cv_patch(cv_content, patch.get("edits"))
+                    print(f"Applied {len(patch['edits'])} edits to the CV.")
+                    return revised_cv
+                except CVPatchError as e:
+                    ai_model.invalidate_structured(patch_prompt, CV_PATCH_SCHEMA, temperature=0.99)
+                    print(f"Patch rejected ({e}), revising the full CV.")
+            return ai_model.get_response(improvement_prompt, history=None, temperature=0.99)
+
+    def _best_candidate(self, improvement_prompt, cv_content, original_cv, job_description_text):
+        """
+        Generate num_candidates improved CVs, critique each one as soon as it is generated,
+        all concurrently, and keep the best graded.
+
+        Candidates are critiqued by _critique_cv, like the CV of a serial round, so their
+        grades compare with the grades of runs with a single candidate.
+
+        Returns:
+            tuple: The best CV and its critique, grade and per-criterion grades.
+        """
+        def candidate():
+            revised_cv = self._revise_cv(improvement_prompt, cv_content)
+            if revised_cv is None:
+                raise ValueError("Failed to get a response from the AI model.")
+            return revised_cv, self._critique_cv(revised_cv, original_cv, job_description_text)
+
+        results = self.executor.map([candidate] * self.num_candidates, return_exceptions=True)
+        candidates = [result for result in results if not isinstance(result, BaseException)]
+        if not candidates:
+            raise results[0]
+        print(f"Candidate grades: {[critique_result[1] for _, critique_result in candidates]}")
+        return max(candidates, key=lambda result: result[1][1])
+
+    def clear_history(self):
+        """
+        Forget the conversation history.
+        """
+        self.history = []
 
     def improve_cover_letter(self, cv_text, cover_letter, job_description_text):
         """
@@ -127,49 +259,56 @@ Tailor the letter to the specific job requirements and showcase the candidate's
 
         return cover_letter, critique
 
-    def improve_cv(self, original_cv,  job_description_text):
+    def improve_cv(self, original_cv,  job_description_text, company_name_and_job_name=None):
         """
         Perform iterative improvements on the CV based on detailed critiques.
 
         Args:
             original_cv (str): The full text of the original CV.
-            personal_info (str): The personal information text from the CV.
-            job_history (str): The job history text from the CV.
-            skills (str): The skills extracted from the CV.
             job_description_text (str): The job description text.
+            company_name_and_job_name (str): The 'Company|Job' string when already extracted by the caller.
 
         Returns:
             tuple: The improved CV and the final detailed critique.
         """
+        self.budget.start(self.cover_letter_gen.ai_model, getattr(self.cover_letter_gen, "repair_model", None))
+        try:
+            return self._improve_cv(original_cv, job_description_text, company_name_and_job_name)
+        finally:
+            self.budget.stop()
+            print("Budget summary:", self.budget.summary())
+
+    def _improve_cv(self, original_cv, job_description_text, company_name_and_job_name):
+        if self.reset_history_per_run:
+            self.clear_history()
         total_reward = 0
         previous_grade = 0
-        company_name_and_job_name = extract_company_name_and_job_name(job_description_text,self.cover_letter_gen.ai_model.api_key)
+        if company_name_and_job_name is None:
+            company_name_and_job_name = extract_company_name_and_job_name(job_description_text,self.cover_letter_gen.ai_model.api_key)
         company_name_and_job_name = company_name_and_job_name.replace("/","_").replace("|","_")
         # Combine initial CV sections
         cv_content = self.cover_letter_gen.generate_cv(original_cv, job_description_text, original_cv, history=None)
         print("cover_letter_gen.generate_cv cv_content")
         print(cv_content)
-        grades_names = ["Relevance to the Job", "Clarity and Structure","Skills Presentation",
-            "Professionalism","Overall"]
-        grades_df = pd.DataFrame(columns=['iteration']+grades_names)
+        run_id = self.grade_log.start_run(type(self).__name__, company_name_and_job_name)
         final_cv = cv_content
+        # Critique of the current CV when it was already critiqued while choosing among candidates
+        next_critique = None
         for iteration in range(self.max_iterations):
 
             # Obtain a detailed critique and grade for the current CV
-            critique, grade, grades_dict = self.cover_letter_gen.create_critique(
-                cv_content, original_cv, job_description_text, history=self.history
-            )
+            if next_critique is not None:
+                critique, grade, grades_dict = next_critique
+                next_critique = None
+            else:
+                critique, grade, grades_dict = self._critique_cv(cv_content, original_cv, job_description_text)
             print("grades_dict\n",grades_dict)
-            iteration_dict = {'iteration': iteration}
-
-            # Merge the dictionaries and convert to DataFrame
-            temp_df = pd.DataFrame({**iteration_dict, **grades_dict}, index=[0])
-
-            # Append to the main DataFrame
-            grades_df = pd.concat([grades_df, temp_df], ignore_index=True)
+            # Committed right away, so the grades survive whichever way the run ends
+            self.grade_log.log(run_id, iteration, grades_dict)
 
             total_reward += grade
             self.grades.append(grade)
+            self.budget.record_grade(grade)
             print(f"Iteration {iteration + 1}, Grade: {grade}, Cumulative Reward: {total_reward}")
 
             # Add critique to the assistant's responses in history
@@ -183,19 +322,17 @@ Tailor the letter to the specific job requirements and showcase the candidate's
 
             if grade >= 9:
                 print("Achieved satisfactory grade.")
-                company_name_and_job_name = company_name_and_job_name.replace("|","_")
-                print("$"*77)
-                print(company_name_and_job_name)
-                print(os.path.join("Output","Grades",company_name_and_job_name + "_BasicIterativeAgent_grades.csv"))
-
-                grades_df.to_csv(os.path.join("Output","Grades",company_name_and_job_name + "_BasicIterativeAgent_grades.csv"), index=False)
+                break
 
+            reason = self.budget.stop_reason()
+            if reason:
+                print(f"Stopping after iteration {iteration + 1}: {reason}.")
                 break
 
             # Use the critique to guide CV improvements
             print("_input_cv_")
             print(cv_content)
-            improvement_prompt = f"""
+            improvement_instructions = """
             You are tasked with improving the candidate's CV iteratively. Your goal is to align the CV with the job description, ensure factual correctness, and enhance readability and impact. In each iteration, you must address the critique points and ensure measurable improvements in the following categories, while ensuring that all claims are substantiated with real, verifiable results.
 
             ### Key Improvement Areas:
@@ -236,19 +373,6 @@ Tailor the letter to the specific job requirements and showcase the candidate's
             - **Specific Examples**: For any critique pointing out missing or underdeveloped content, provide detailed examples or elaborations. For instance, when mentioning portfolio optimization, specify the techniques used (e.g., genetic algorithms, Markowitz portfolio theory) and how they were delivered (e.g., as client-facing software or within an internal tool).
             - **Iteration-Specific Changes**: Each iteration must introduce new improvements based on the critique. Avoid repeating similar changes without adding new value.
 
-            ### Context:
-            - **Job Description**:  
-            {job_description_text}
-
-            - **Current CV**:  
-            {cv_content}
-
-            - **Original CV Version**:  
-            {original_cv}
-
-            - **Critique**:  
-            {critique}
-
             ### Focus:
             - Ensure that all **company names** from the original CV are present.
             - Ensure dynamic and targeted improvements in each iteration.
@@ -258,10 +382,17 @@ Tailor the letter to the specific job requirements and showcase the candidate's
             ### Iteration Goal:
             At the end of each iteration, the improved CV should demonstrate noticeable progress in alignment with the job description and critique feedback, supported by **real, verifiable project results and achievements**.
             The result have to be reliable any qunatitative  asseration should have reference in the **Original CV Version**
-            
-            
 
+            ### Context:
             """
+            # Instructions, original CV and job description are identical in every iteration and
+            # form the prefix the provider caches; only the current CV and critique follow it
+            improvement_prompt = (PromptBuilder(improvement_instructions)
+                                  .static("Original CV Version", original_cv)
+                                  .static("Job Description", job_description_text)
+                                  .variable("Current CV", cv_content)
+                                  .variable("Critique", critique)
+                                  .build())
 
             print("improvement_prompt")
 
@@ -270,7 +401,11 @@ Tailor the letter to the specific job requirements and showcase the candidate's
 
             # Generate the next version of the CV
             #cv_content = self.cover_letter_gen.ai_model.get_response(improvement_prompt, history=self.history , temperature=0.99)
-            cv_content = self.cover_letter_gen.ai_model.get_response(improvement_prompt, history=None,temperature=0.99)
+            if self.num_candidates > 1:
+                cv_content, next_critique = self._best_candidate(improvement_prompt, cv_content, original_cv,
+                                                                 job_description_text)
+            else:
+                cv_content = self._revise_cv(improvement_prompt, cv_content)
             # Store the improved CV in the assistant's response history
             self._add_to_history("assistant", cv_content)
 
@@ -321,13 +456,18 @@ Tailor the letter to the specific job requirements and showcase the candidate's
             """
 
             self._add_to_history("user", enforcement_prompt)
-            final_cv = self.cover_letter_gen.ai_model.get_response(enforcement_prompt, history=self.history,
-                                                                   temperature=0.1)
+            with llm_stage("format"):
+                final_cv = self.cover_letter_gen.ai_model.get_response(enforcement_prompt, history=self.history,
+                                                                       temperature=0.1)
 
+        if next_critique is not None:
+            # The last candidate was critiqued while being selected; report and record that critique
+            critique, grade, grades_dict = next_critique
+            self.grades.append(grade)
+            self.budget.record_grade(grade)
+            self.grade_log.log(run_id, self.max_iterations, grades_dict)
         print("^"*77)
-        print(company_name_and_job_name)
-        print(os.path.join("Output", "Grades", company_name_and_job_name.replace("|","_") +"_BasicIterativeAgent__grades.csv"))
-        grades_df.to_csv(os.path.join("Output", "Grades", company_name_and_job_name.replace("|","_") +"_BasicIterativeAgent__grades.csv"), index= False)
+        print(company_name_and_job_name, "grades logged under run", run_id)
         print("final_cv")
         print(final_cv)
         return final_cv, critique
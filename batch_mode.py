@@ -0,0 +1,305 @@
+# batch_mode.py
+import json
+import logging
+import os
+import time
+import uuid
+
+from ai_interaction import LLMModel, CVGenerator
+from llm_cache import LLMResponseCache
+
+DEFAULT_BATCH_DIR = os.path.join("Output", "Batch")
+FINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchPendingError(Exception):
+    """
+    Raised by BatchLLMModel when a request has been queued for the next batch
+    instead of being answered. Stages run in batch mode must let it propagate.
+    """
+
+
+class BatchLLMModel(LLMModel):
+    """
+    LLMModel that answers from ingested batch results and queues everything else.
+
+    A stage is run once to collect its requests (each unanswered call queues a request
+    and raises BatchPendingError), the queued requests are written to a JSONL batch file,
+    and once the batch output is ingested the stage is replayed and its calls are
+    answered from the results.
+    """
+
+    def __init__(self, ai_model, cache=None):
+        """
+        Args:
+            ai_model (OpenAIModel): The model whose name and message format the batch requests use.
+            cache (LLMResponseCache): Optional cache that ingested results are also written to,
+                so later online runs reuse them.
+        """
+        self.ai_model = ai_model
+        self.model_name = ai_model.model_name
+        self.cache = cache
+        self.results = {}
+        self.pending = {}
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (api_key, client, ...) to existing callers.
+        if name == "ai_model":
+            raise AttributeError(name)
+        return getattr(self.ai_model, name)
+
+    def add_usage_listener(self, listener):
+        self.ai_model.add_usage_listener(listener)
+
+    def remove_usage_listener(self, listener):
+        self.ai_model.remove_usage_listener(listener)
+
+    def _request_key(self, messages, temperature):
+        return LLMResponseCache.make_key(self.model_name, messages, temperature)
+
+    def get_response(self, prompt, history=None, temperature=0.7):
+        """
+        Return the batch result for this request, or queue it and raise BatchPendingError.
+        """
+        messages = self.ai_model._build_messages(prompt, history)
+        key = self._request_key(messages, temperature)
+        if key in self.results:
+            return self.results[key]
+        if key not in self.pending:
+            self.pending[key] = {
+                "custom_id": key,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model_name, "messages": messages, "temperature": temperature},
+            }
+        raise BatchPendingError(f"Request {key[:12]} queued for the next batch.")
+
+    async def aget_response(self, prompt, history=None, temperature=0.7):
+        return self.get_response(prompt, history=history, temperature=temperature)
+
+    def invalidate(self, prompt, history=None, temperature=0.7):
+        """
+        Drop the ingested result of a request the caller rejected, so asking again queues it.
+        """
+        key = self._request_key(self.ai_model._build_messages(prompt, history), temperature)
+        self.results.pop(key, None)
+        if self.cache is not None:
+            self.cache.delete(key)
+
+    def write_batch_file(self, path):
+        """
+        Write the queued requests to a JSONL batch file in the OpenAI Batch API format.
+
+        Returns:
+            int: The number of requests written.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for request in self.pending.values():
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        return len(self.pending)
+
+    def ingest_results(self, path):
+        """
+        Read a batch output file and store its answers.
+
+        Returns:
+            int: The number of successful results ingested.
+        """
+        ingested = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = record["custom_id"]
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    logging.error(f"Batch request {key[:12]} failed: {record.get('error') or response}")
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"].strip()
+                self.results[key] = content
+                self.pending.pop(key, None)
+                if self.cache is not None:
+                    self.cache.set(key, content, self.model_name)
+                ingested += 1
+        return ingested
+
+
+class LocalBatchEndpoint:
+    """
+    File-based stand-in for the OpenAI Batch API.
+
+    Batches are answered synchronously by ``responder`` at submission time, and the
+    output file is written in the same format the real endpoint produces.
+    """
+
+    def __init__(self, responder, batch_dir=DEFAULT_BATCH_DIR):
+        """
+        Args:
+            responder: An LLMModel used to answer requests, or a callable taking the
+                request body and returning the response text.
+            batch_dir (str): Directory where output files are written.
+        """
+        self.responder = responder
+        self.batch_dir = batch_dir
+        self.batches = {}
+
+    def _answer(self, body):
+        if isinstance(self.responder, LLMModel):
+            messages = body["messages"]
+            # The system message is rebuilt by the responder itself
+            history = [message for message in messages[:-1] if message["role"] != "system"]
+            return self.responder.get_response(messages[-1]["content"], history=history,
+                                               temperature=body.get("temperature", 0.7))
+        return self.responder(body)
+
+    def submit(self, input_path):
+        batch_id = "batch_" + uuid.uuid4().hex
+        output_path = os.path.join(self.batch_dir, batch_id + "_output.jsonl")
+        os.makedirs(self.batch_dir, exist_ok=True)
+        with open(input_path, "r", encoding="utf-8") as f_in, open(output_path, "w", encoding="utf-8") as f_out:
+            for line in f_in:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                content = self._answer(request["body"])
+                if content is None:
+                    record = {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": None,
+                              "error": {"message": "No response from the model."}}
+                else:
+                    record = {"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "error": None,
+                              "response": {"status_code": 200,
+                                           "body": {"choices": [{"message": {"role": "assistant", "content": content}}]}}}
+                f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.batches[batch_id] = output_path
+        return batch_id
+
+    def status(self, batch_id):
+        return "completed" if batch_id in self.batches else "failed"
+
+    def download(self, batch_id, output_path):
+        if os.path.abspath(self.batches[batch_id]) != os.path.abspath(output_path):
+            with open(self.batches[batch_id], "r", encoding="utf-8") as f_in, \
+                    open(output_path, "w", encoding="utf-8") as f_out:
+                f_out.write(f_in.read())
+        return output_path
+
+
+class OpenAIBatchEndpoint:
+    """
+    The OpenAI Batch API: requests are answered within the completion window at batch pricing.
+    """
+
+    def __init__(self, client, completion_window="24h"):
+        """
+        Args:
+            client (openai.OpenAI): The OpenAI client.
+            completion_window (str): The batch completion window.
+        """
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, input_path):
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                           completion_window=self.completion_window)
+        return batch.id
+
+    def status(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id, output_path):
+        batch = self.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            raise ValueError(f"Batch {batch_id} has no output file (status: {batch.status}).")
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(self.client.files.content(batch.output_file_id).text)
+        return output_path
+
+
+def run_batched_stage(stage, items, batch_model, endpoint, stage_name="stage", batch_dir=DEFAULT_BATCH_DIR,
+                      poll_interval=60, max_rounds=5):
+    """
+    Run a pipeline stage over many items with its LLM calls sent as batches.
+
+    Every item is attempted; the calls that are not answered yet are collected into one
+    batch file, submitted, polled until done and ingested, and the items that were waiting
+    are replayed. Stages that make several dependent calls take one round per call, so the
+    stage must be safe to re-run.
+
+    Args:
+        stage (callable): Called with one item; must use ``batch_model`` for its LLM calls.
+        items (list): The inputs of the stage.
+        batch_model (BatchLLMModel): The batch model the stage uses.
+        endpoint: LocalBatchEndpoint, OpenAIBatchEndpoint or an object with the same methods.
+        stage_name (str): Used to name the batch files.
+        batch_dir (str): Directory of the batch input and output files.
+        poll_interval (float): Seconds between status checks.
+        max_rounds (int): Maximum number of batches submitted.
+
+    Returns:
+        list: The stage result of each item, in input order; an item whose stage raised
+        has the exception as its result.
+    """
+    results = [None] * len(items)
+    waiting = list(range(len(items)))
+    for round_number in range(max_rounds + 1):
+        still_waiting = []
+        for index in waiting:
+            try:
+                results[index] = stage(items[index])
+            except BatchPendingError:
+                still_waiting.append(index)
+            except Exception as e:
+                # One bad item must not lose the results already paid for
+                logging.error(f"Item {index} of '{stage_name}' failed: {type(e).__name__}: {e}")
+                results[index] = e
+        waiting = still_waiting
+        if not waiting:
+            return results
+        if round_number == max_rounds:
+            break
+
+        input_path = os.path.join(batch_dir, f"{stage_name}_round{round_number}_requests.jsonl")
+        count = batch_model.write_batch_file(input_path)
+        batch_id = endpoint.submit(input_path)
+        print(f"Submitted batch {batch_id} with {count} requests for {len(waiting)} items of '{stage_name}'.")
+        status = endpoint.status(batch_id)
+        while status not in FINAL_BATCH_STATUSES:
+            time.sleep(poll_interval)
+            status = endpoint.status(batch_id)
+        if status != "completed":
+            raise RuntimeError(f"Batch {batch_id} for '{stage_name}' ended with status '{status}'.")
+        output_path = os.path.join(batch_dir, f"{stage_name}_round{round_number}_results.jsonl")
+        endpoint.download(batch_id, output_path)
+        if batch_model.ingest_results(output_path) == 0:
+            raise RuntimeError(f"Batch {batch_id} for '{stage_name}' returned no usable results.")
+    raise RuntimeError(f"Stage '{stage_name}' still had {len(waiting)} items waiting after {max_rounds} batches.")
+
+
+def batch_critique_cvs(items, batch_model, endpoint, batch_dir=DEFAULT_BATCH_DIR, poll_interval=60, max_rounds=5):
+    """
+    Critique many CVs offline, with the critique calls sent as batches.
+
+    Used for bulk evaluation, where nothing waits on a single critique. A critique whose
+    grades need repairing or regenerating takes one more round per extra call.
+
+    Args:
+        items (list): (cv_content, original_cv, job_description_text) tuples.
+        batch_model (BatchLLMModel): The batch model the critiques are queued on.
+        endpoint: LocalBatchEndpoint, OpenAIBatchEndpoint or an object with the same methods.
+        batch_dir (str): Directory of the batch input and output files.
+        poll_interval (float): Seconds between status checks.
+        max_rounds (int): Maximum number of batches submitted.
+
+    Returns:
+        list: The (critique, overall grade, per-criterion grades) of each item, in input order,
+        or the exception of an item whose critique failed.
+    """
+    cv_gen = CVGenerator(batch_model)
+    return run_batched_stage(lambda item: cv_gen.create_critique(*item), items, batch_model, endpoint,
+                             stage_name="critique", batch_dir=batch_dir, poll_interval=poll_interval,
+                             max_rounds=max_rounds)
@@ -0,0 +1,117 @@
+# benchmark_pdf_backends.py
+import argparse
+import difflib
+import glob
+import os
+import re
+import time
+
+from data_handling import PDF_BACKENDS, pdf_extractor_version
+
+# Headings the section parsing relies on; a backend must find the ones the reference finds
+CV_SECTION_HEADINGS = ("Summary", "Experience", "Skills", "Education", "Projects", "Publications")
+
+
+def find_sections(text):
+    """
+    Return the CV section headings that start a line (or a page) of the text.
+    """
+    return {heading for heading in CV_SECTION_HEADINGS
+            if re.search(rf"(?:^|\f)[^\w\n]*(Work\s+)?{heading}\b", text, re.IGNORECASE | re.MULTILINE)}
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def benchmark_backend(backend, pdf_paths, references, repeat=3):
+    """
+    Extract every PDF with a backend and compare the texts to the reference ones.
+
+    Args:
+        backend (str): A key of PDF_BACKENDS.
+        pdf_paths (list): The PDF files of the corpus.
+        references (dict): Reference text by path.
+        repeat (int): Number of timed passes over the corpus; the fastest is kept.
+
+    Returns:
+        dict: Pages per second, mean similarity to the reference text, the files whose
+        section headings differ from the reference and the files the backend failed on.
+    """
+    extract = PDF_BACKENDS[backend][0]
+    # A file this backend cannot read is reported and left out of every pass
+    errors = {}
+    for path in pdf_paths:
+        try:
+            extract(path)
+        except ImportError:
+            raise
+        except Exception as e:
+            errors[os.path.basename(path)] = f"{type(e).__name__}: {e}"
+    pdf_paths = [path for path in pdf_paths if os.path.basename(path) not in errors]
+    best_seconds = None
+    texts = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in pdf_paths:
+            texts[path] = extract(path)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+    pages = sum(text.count("\f") for text in texts.values())
+    similarities = [difflib.SequenceMatcher(None, _normalize(references[path]), _normalize(texts[path]),
+                                            autojunk=False).ratio() for path in pdf_paths]
+    section_mismatches = [os.path.basename(path) for path in pdf_paths
+                          if find_sections(texts[path]) != find_sections(references[path])]
+    return {
+        "version": pdf_extractor_version(backend),
+        "pages": pages,
+        "seconds": best_seconds,
+        "pages_per_second": pages / best_seconds if best_seconds else 0.0,
+        "similarity": sum(similarities) / len(similarities) if similarities else 0.0,
+        "section_mismatches": section_mismatches,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF text extraction backends on a CV corpus.")
+    parser.add_argument("corpus", help="Directory of CV PDF files, searched recursively.")
+    parser.add_argument("--backends", nargs="+", default=list(PDF_BACKENDS), choices=list(PDF_BACKENDS))
+    parser.add_argument("--reference", default="pdfminer", choices=list(PDF_BACKENDS),
+                        help="Backend whose text the others are compared to.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per backend; the fastest is kept.")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not pdf_paths:
+        parser.exit(1, f"No PDF files found under {os.path.abspath(args.corpus)}; pass a directory of CV PDFs.\n")
+    reference_extract = PDF_BACKENDS[args.reference][0]
+    references = {}
+    for path in pdf_paths:
+        try:
+            references[path] = reference_extract(path)
+        except ImportError:
+            raise
+        except Exception as e:
+            # Corrupt or encrypted files are skipped, as in the ingestion
+            print(f"Skipping {path}: {args.reference} failed with {type(e).__name__}: {e}")
+    pdf_paths = [path for path in pdf_paths if path in references]
+    if not pdf_paths:
+        parser.exit(1, f"No PDF file under {os.path.abspath(args.corpus)} could be read by {args.reference}.\n")
+    print(f"{len(pdf_paths)} PDF files, reference backend: {args.reference}")
+
+    print(f"{'backend':<10} {'version':<28} {'pages':>6} {'pages/s':>9} {'similarity':>10}  section mismatches")
+    for backend in args.backends:
+        try:
+            result = benchmark_backend(backend, pdf_paths, references, repeat=args.repeat)
+        except ImportError as e:
+            print(f"{backend:<10} not installed ({e})")
+            continue
+        print(f"{backend:<10} {result['version']:<28} {result['pages']:>6} {result['pages_per_second']:>9.1f} "
+              f"{result['similarity']:>10.3f}  {', '.join(result['section_mismatches']) or '-'}")
+        for name, error in result["errors"].items():
+            print(f"{'':<10} failed on {name}: {error}")
+
+
+if __name__ == "__main__":
+    main()
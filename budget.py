@@ -0,0 +1,158 @@
+# budget.py
+import threading
+import time
+
+# Share of the prompt price charged for prompt tokens served from the provider's prompt cache
+CACHED_PROMPT_PRICE_RATIO = 0.5
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo-0125": (0.50, 1.50),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+
+def estimate_cost(model_name, prompt_tokens, completion_tokens, cached_tokens=0, prices=None):
+    """
+    Dollar cost of a request; models missing from the price table cost nothing.
+    """
+    prompt_price, completion_price = (prices if prices is not None else MODEL_PRICES).get(model_name, (0.0, 0.0))
+    uncached_tokens = prompt_tokens - cached_tokens
+    return (uncached_tokens * prompt_price + cached_tokens * prompt_price * CACHED_PROMPT_PRICE_RATIO
+            + completion_tokens * completion_price) / 1_000_000
+
+
+class BudgetController:
+    """
+    Stopping controller of an iterative agent run, driven by cost rather than iteration count.
+
+    The controller listens to the token usage of the agent's model and tracks the tokens,
+    dollars, wall time and prompt-cache hit rate of the run. Before each improvement round it predicts the
+    cost of the round from the rounds already done and stops the run when the round would
+    exceed a budget, or when the recent grade trajectory does not promise enough gain.
+    """
+
+    def __init__(self, max_tokens=None, max_cost=None, max_seconds=None, min_expected_gain=None,
+                 trajectory_window=2, prices=None):
+        """
+        Args:
+            max_tokens (int): Token budget of a run; None means no limit.
+            max_cost (float): Dollar budget of a run; None means no limit.
+            max_seconds (float): Wall-time budget of a run; None means no limit.
+            min_expected_gain (float): Stop when the grade gain predicted for the next round,
+                the mean of the last ``trajectory_window`` gains, is below this; None disables it.
+            trajectory_window (int): Number of recent grade changes used for the prediction.
+            prices (dict): Model name to USD per million (prompt, completion) tokens; MODEL_PRICES by default.
+        """
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.max_seconds = max_seconds
+        self.min_expected_gain = min_expected_gain
+        self.trajectory_window = trajectory_window
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self._lock = threading.Lock()
+        self._models = []
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the spending and grades of the previous run.
+        """
+        self.tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.started_at = time.time()
+        self.grades = []
+        self.rounds = 0
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def record_usage(self, model_name, prompt_tokens, completion_tokens, cached_tokens=0):
+        """
+        Usage listener: add the tokens and price of one request to the run.
+        """
+        cost = estimate_cost(model_name, prompt_tokens, completion_tokens, cached_tokens, self.prices)
+        with self._lock:
+            self.tokens += prompt_tokens + completion_tokens
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.cost += cost
+
+    @property
+    def cache_hit_rate(self):
+        """
+        Share of the prompt tokens of the run served from the provider's prompt cache.
+        """
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def start(self, *ai_models):
+        """
+        Reset the run and start listening to the usage of the models it uses.
+        """
+        self.stop()
+        self.reset()
+        for ai_model in ai_models:
+            if ai_model is not None and all(ai_model is not model for model in self._models):
+                ai_model.add_usage_listener(self.record_usage)
+                self._models.append(ai_model)
+
+    def stop(self):
+        """
+        Stop listening to the models of the run.
+        """
+        for ai_model in self._models:
+            ai_model.remove_usage_listener(self.record_usage)
+        self._models = []
+
+    def record_grade(self, grade):
+        """
+        Record the grade reached after a round (the first grade is the starting point).
+        """
+        self.grades.append(grade)
+        self.rounds = len(self.grades) - 1
+
+    def _expected_gain(self):
+        gains = [after - before for before, after in zip(self.grades, self.grades[1:])][-self.trajectory_window:]
+        if not gains:
+            return None
+        return sum(gains) / len(gains)
+
+    def stop_reason(self):
+        """
+        Decide whether another improvement round should run.
+
+        The cost of the next round is predicted as the average cost of the rounds so far,
+        counting the work done before the first grade as one round.
+
+        Returns:
+            str: Why the run should stop, or None to continue.
+        """
+        with self._lock:
+            tokens, cost = self.tokens, self.cost
+        elapsed = self.elapsed
+        rounds_done = max(self.rounds + 1, 1)
+        if self.max_tokens is not None and tokens + tokens / rounds_done > self.max_tokens:
+            return f"token budget: {tokens} used, next round would exceed {self.max_tokens}"
+        if self.max_cost is not None and cost + cost / rounds_done > self.max_cost:
+            return f"cost budget: ${cost:.4f} used, next round would exceed ${self.max_cost:.4f}"
+        if self.max_seconds is not None and elapsed + elapsed / rounds_done > self.max_seconds:
+            return f"time budget: {elapsed:.1f}s used, next round would exceed {self.max_seconds:.1f}s"
+        expected_gain = self._expected_gain()
+        if self.min_expected_gain is not None and expected_gain is not None \
+                and expected_gain < self.min_expected_gain:
+            return f"expected grade gain {expected_gain:.2f} is below {self.min_expected_gain:.2f}"
+        return None
+
+    def summary(self):
+        """
+        The spending of the run.
+        """
+        with self._lock:
+            return {"tokens": self.tokens, "cost": round(self.cost, 6), "seconds": round(self.elapsed, 2),
+                    "cached_prompt_tokens": self.cached_tokens, "cache_hit_rate": round(self.cache_hit_rate, 3),
+                    "rounds": self.rounds, "grades": list(self.grades)}
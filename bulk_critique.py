@@ -0,0 +1,104 @@
+# bulk_critique.py
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from ai_interaction import OpenAIModel
+from batch_mode import DEFAULT_BATCH_DIR, BatchLLMModel, OpenAIBatchEndpoint, batch_critique_cvs
+from data_handling import load_and_extract_text
+from http_clients import get_openai_client
+from llm_cache import LLMResponseCache
+
+DEFAULT_CRITIQUES_PATH = os.path.join(DEFAULT_BATCH_DIR, "critiques.jsonl")
+
+
+def critique_corpus(directory, job_description_text, batch_model, endpoint, batch_dir=DEFAULT_BATCH_DIR,
+                    poll_interval=60, max_rounds=5):
+    """
+    Critique every CV PDF under a directory against one job description, in batches.
+
+    Args:
+        directory (str): Directory searched recursively for PDF files.
+        job_description_text (str): The job description the CVs are graded against.
+        batch_model (BatchLLMModel): The batch model the critiques are queued on.
+        endpoint: OpenAIBatchEndpoint, LocalBatchEndpoint or an object with the same methods.
+        batch_dir (str): Directory of the batch input and output files.
+        poll_interval (float): Seconds between status checks.
+        max_rounds (int): Maximum number of batches submitted.
+
+    Returns:
+        list: One record per PDF with its grades and critique, or the error that stopped it.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "**", "*.pdf"), recursive=True))
+    records = {}
+    items = []
+    for path in paths:
+        try:
+            cv_text = load_and_extract_text(path)
+        except Exception as e:
+            records[path] = {"path": path, "error": f"{type(e).__name__}: {e}"}
+            continue
+        records[path] = None
+        items.append((path, (cv_text, cv_text, job_description_text)))
+
+    results = batch_critique_cvs([item for _, item in items], batch_model, endpoint, batch_dir=batch_dir,
+                                 poll_interval=poll_interval, max_rounds=max_rounds)
+    for (path, _), result in zip(items, results):
+        if isinstance(result, Exception):
+            records[path] = {"path": path, "error": f"{type(result).__name__}: {result}"}
+        else:
+            critique, overall_grade, grades = result
+            records[path] = {"path": path, "overall_grade": overall_grade, "grades": grades, "critique": critique,
+                             "error": None}
+    return [records[path] for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Critique every CV PDF in a directory with the OpenAI Batch API.")
+    parser.add_argument("directory", help="Directory searched recursively for PDF files.")
+    parser.add_argument("job_description", help="Text file with the job description.")
+    parser.add_argument("--output", default=DEFAULT_CRITIQUES_PATH, help="JSONL file the critiques are written to.")
+    parser.add_argument("--model", default="gpt-4o", help="Model the critiques are requested from.")
+    parser.add_argument("--poll-interval", type=float, default=60, help="Seconds between batch status checks.")
+    parser.add_argument("--max-rounds", type=int, default=5, help="Maximum number of batches submitted.")
+    args = parser.parse_args()
+
+    load_dotenv('.env', override=True)
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("API key not found. Please set the appropriate environment variable.")
+    with open(args.job_description, "r", encoding="utf-8") as f:
+        job_description_text = f.read()
+
+    start = time.time()
+    cache = LLMResponseCache()
+    try:
+        # Ingested results also go to the response cache, so later online runs reuse them
+        batch_model = BatchLLMModel(OpenAIModel(api_key=api_key, model_name=args.model), cache=cache)
+        records = critique_corpus(args.directory, job_description_text, batch_model,
+                                  OpenAIBatchEndpoint(get_openai_client(api_key)),
+                                  poll_interval=args.poll_interval, max_rounds=args.max_rounds)
+    finally:
+        cache.close()
+    if not records:
+        parser.exit(1, f"No PDF files found under {os.path.abspath(args.directory)}.\n")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    failed = sum(record["error"] is not None for record in records)
+    for record in records:
+        if record["error"] is not None:
+            logging.error(f"Failed to critique {record['path']}: {record['error']}")
+    print(f"Critiqued {len(records) - failed}, failed {failed} in {time.time() - start:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import os
-from openai import OpenAI
+import re
+from http_clients import get_openai_client
+from llm_events import LLMCall, openai_usage
 from dotenv import load_dotenv
 from data_handling import load_and_extract_text
 # Load environment variables from .env file
@@ -14,10 +16,11 @@ def get_llm_response(prompt,api_key):
     """
     Function to get a response from OpenAI GPT model using the provided prompt.
     """
+    call = LLMCall("gpt-4o")
     try:
         if not isinstance(prompt, str):
             raise ValueError("Input must be a string enclosed in quotes.")
-        client = OpenAI(api_key=api_key)
+        client = get_openai_client(api_key)
         completion = client.chat.completions.create(
             model="gpt-4o",
             messages=[
@@ -29,37 +32,116 @@ def get_llm_response(prompt,api_key):
             ],
             temperature=0.0
         )
+        call.finish(*(openai_usage(completion) or ()))
         response = completion.choices[0].message.content
         return response
     except Exception as e:
+        call.finish(error=e)
         print(f"Error: {str(e)}")
         return None
 
 
-def extract_information_from_cv(cv_text,api_key):
+# Contact fields found locally; the LLM is only asked for them when a required one is missing
+CONTACT_FIELDS = ("Full name", "Email", "Phone", "LinkedIn", "GitHub")
+REQUIRED_CONTACT_FIELDS = ("Full name", "Email")
+# Answers the LLM gives for a field it did not find
+MISSING_VALUES = {"", "none", "n/a", "na", "not found", "not provided", "not available", "unknown", "-"}
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_PATTERN = re.compile(r"(?<![\w/])\+?\(?\d[\d \t().-]{6,}\d(?![\w/])")
+LINKEDIN_PATTERN = re.compile(r"(?:https?://)?(?:[\w-]+\.)?linkedin\.com/in/[\w%-]+/?", re.IGNORECASE)
+GITHUB_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?github\.com/[A-Za-z0-9-]+/?", re.IGNORECASE)
+NAME_PATTERN = re.compile(r"^[^\W\d_][^\W\d_'.-]*(?:[\s'.-]+[^\W\d_][^\W\d_'.-]*){1,3}\.?$")
+NOT_A_NAME = re.compile(r"\b(curriculum|vitae|resume|résumé|cv|profile|summary|contact|engineer|scientist|developer|"
+                        r"manager|analyst|senior|junior|lead|director|consultant|specialist|architect|designer|"
+                        r"researcher|intern|officer|administrator|head|principal|staff|student|data|software)\b",
+                        re.IGNORECASE)
+# Header lines giving the applicant's address or city instead of the name
+LOCATION_WORDS = re.compile(r"\b(address|street|st|road|rd|avenue|ave|blvd|boulevard|lane|apt|apartment|suite|floor|"
+                            r"city|district|county|state|province|country|tel|aviv|jerusalem|haifa|herzliya|ramat|"
+                            r"petah|tikva|netanya|rehovot|israel|london|york|paris|berlin|san|francisco|los|angeles|"
+                            r"usa|uk|united|kingdom|germany|france|remote|hybrid|relocation)\b", re.IGNORECASE)
+
+
+def _find_phone(cv_text):
+    for match in PHONE_PATTERN.finditer(cv_text):
+        digits = re.sub(r"\D", "", match.group())
+        # Years and date ranges have fewer digits than a phone number
+        if 9 <= len(digits) <= 15:
+            return match.group().strip()
+    return None
+
+
+def _find_name(cv_text, max_lines=5):
+    # The name is one of the first lines: two to four words, no digits and no heading, job-title
+    # or location word
+    lines = [line.strip() for line in cv_text.strip().splitlines() if line.strip()]
+    candidates = []
+    for line in lines[:max_lines]:
+        words = line.split()
+        # A capitalised first name and surname, e.g. "Jane Doe", "Itay Ben-Dan", "JOHN O'NEIL"
+        capitalised = len(words) >= 2 and words[0][0].isupper() and words[-1][0].isupper()
+        if NAME_PATTERN.match(line) and capitalised and not NOT_A_NAME.search(line) \
+                and not LOCATION_WORDS.search(line):
+            candidates.append(line)
+    # Prefer the line whose words are in the email address, e.g. "Jane Doe" for jane.doe@mail.com
+    email = next(iter(EMAIL_PATTERN.findall(cv_text)), None)
+    if email:
+        local_part = re.sub(r"[^a-z]", "", email.split("@")[0].lower())
+        for line in candidates:
+            words = [re.sub(r"[^a-z]", "", word) for word in line.lower().split()]
+            if any(len(word) >= 3 and word in local_part for word in words):
+                return line
+    return candidates[0] if candidates else None
+
+
+def extract_contact_info_locally(cv_text):
     """
-    Extracts applicant's name, email, phone, address, GitHub, LinkedIn, and skills from the provided CV text.
+    Extract the applicant's name, email, phone, LinkedIn and GitHub from the CV text with patterns.
 
     Args:
         cv_text (str): The full text of the CV.
 
+    Returns:
+        dict: The fields of CONTACT_FIELDS that were found.
+    """
+    found = {
+        "Full name": _find_name(cv_text),
+        "Email": next(iter(EMAIL_PATTERN.findall(cv_text)), None),
+        "Phone": _find_phone(cv_text),
+        "LinkedIn": next(iter(LINKEDIN_PATTERN.findall(cv_text)), None),
+        "GitHub": next(iter(GITHUB_PATTERN.findall(cv_text)), None),
+    }
+    return {key: value for key, value in found.items() if value}
+
+
+def extract_information_from_cv(cv_text,api_key, use_llm_fallback=True):
+    """
+    Extracts applicant's name, email, phone, LinkedIn and GitHub from the provided CV text.
+
+    The fields are found locally with patterns. The LLM is only called when a required
+    field (name or email) is missing, and its answer fills the missing fields only.
+
+    Args:
+        cv_text (str): The full text of the CV.
+        api_key (str): The OpenAI API key used by the fallback call.
+        use_llm_fallback (bool): Ask the LLM for the missing fields when a required one is missing.
+
     Returns:
         dict: A dictionary containing the extracted information.
     """
+    extracted_info = extract_contact_info_locally(cv_text)
+    missing = [field for field in CONTACT_FIELDS if field not in extracted_info]
+    if not use_llm_fallback or all(field in extracted_info for field in REQUIRED_CONTACT_FIELDS):
+        return extracted_info
+
+    fields = "\n".join(f"    - {field}" for field in missing)
     prompt = f"""
     Extract the following information from the given CV text:
-    - Full name of the applicant
-    - Email address
-    - Phone number
-    - Physical address
-    - GitHub profile (if present)
-    - LinkedIn profile (if present)
-    - Key skills (list any technical skills, programming languages, tools, or expertise areas)
-    - Homepage (if present)
-    - Projects (if present)
-    - Publications (if present)
-
-    If any of the information is missing, simply omit it from the result. Provide the output in a structured format.
+{fields}
+
+    Answer with one line per field found, formatted exactly as "<field>: <value>" with the field names above.
+    If any of the information is missing, simply omit it from the result.
 
     Here is the CV text:
     \"{cv_text}\"
@@ -68,13 +150,14 @@ def extract_information_from_cv(cv_text,api_key):
     response = get_llm_response(prompt,api_key)
 
     if response:
-        # Parse the response into a dictionary (assume that the GPT response is structured)
-        extracted_info = parse_extracted_info(response)
-        for key, item in extracted_info.items():
-            print(key,"\n",item)
-        return extracted_info
-    else:
-        return {}
+        llm_info = parse_extracted_info(response)
+        for field in missing:
+            value = llm_info.get(field, "")
+            if value.strip().lower() not in MISSING_VALUES:
+                extracted_info[field] = value
+    return extracted_info
+
+
 def parse_extracted_info(response):
     """
     Parses the structured response from GPT into a dictionary for easy access to the fields.
@@ -88,22 +171,17 @@ def parse_extracted_info(response):
     # Initialize an empty dictionary to hold the extracted information
     info_dict = {}
 
-    # Split the response by lines
-    lines = response.split("\n")
-
     # Loop through lines and parse key-value pairs (Name, Email, etc.)
-    for line in lines:
-        if line.strip():  # Skip empty lines
-            key_value = line.split(":")
-            if len(key_value) == 2:
-                key, value = key_value[0].strip(), key_value[1].strip()
-                print(key)
-                print("value :",value , type(value))
-                if isinstance(value,str) and value[0] == "\"" and value[-1] == "\"" :
-                    print("HERE VAL")
-                    value = value[1:-1]
-
-                info_dict[key] = value
+    for line in response.split("\n"):
+        # Split on the first ':' only, so URL values keep their scheme
+        key, separator, value = line.partition(":")
+        key = key.strip(" -*")
+        value = value.strip()
+        if not separator or not key or not value:
+            continue
+        if len(value) > 1 and value[0] == "\"" and value[-1] == "\"":
+            value = value[1:-1]
+        info_dict[key] = value
 
     return info_dict
 
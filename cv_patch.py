@@ -0,0 +1,92 @@
+# cv_patch.py
+import re
+
+# JSON schema of a CV revision returned as edits instead of a full CV
+CV_PATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "edits": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "section": {"type": "string"},
+                    "find": {"type": "string"},
+                    "replace": {"type": "string"},
+                },
+                "required": ["section", "find", "replace"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["edits"],
+    "additionalProperties": False,
+}
+
+CV_PATCH_INSTRUCTIONS = """
+            ### Output Format:
+            Do not rewrite the whole CV. Return only the edits needed to address the critique, as a list of
+            replacements applied to the **Current CV**:
+            - "section": the name of the CV section the edit belongs to (e.g. "Summary", "Work Experience").
+            - "find": a passage copied exactly, character for character, from the Current CV; keep it short
+              (a bullet or a sentence) but long enough to be unique within its section.
+            - "replace": the text that replaces it.
+            """
+
+
+class CVPatchError(ValueError):
+    """
+    Raised when a CV patch cannot be applied or produces an invalid CV.
+    """
+
+
+def _section_start(cv_content, section):
+    """
+    Position of the line holding the section heading, or None if it is not found.
+    """
+    match = re.search(rf"^[^\w\n]*{re.escape(section.strip())}\b", cv_content, re.IGNORECASE | re.MULTILINE)
+    return match.start() if match else None
+
+
+def apply_cv_patch(cv_content, edits, min_length_ratio=0.5):
+    """
+    Apply section-scoped find/replace edits to a CV and validate the result.
+
+    An edit whose passage appears once in the CV replaces it; a passage that appears several
+    times is replaced at its first occurrence after the heading of the edit's section.
+
+    Args:
+        cv_content (str): The current CV.
+        edits (list): Dictionaries with 'section', 'find' and 'replace'.
+        min_length_ratio (float): The patched CV must keep at least this fraction of the
+            current CV's length, which catches edits that drop whole sections.
+
+    Returns:
+        str: The patched CV.
+
+    Raises:
+        CVPatchError: If there is no edit, a passage is missing or ambiguous, or the result is invalid.
+    """
+    if not edits:
+        raise CVPatchError("The patch has no edits.")
+    patched = cv_content
+    for edit in edits:
+        find = edit.get("find") or ""
+        replace = edit.get("replace") or ""
+        section = edit.get("section") or ""
+        if not find.strip():
+            raise CVPatchError(f"Edit in section '{section}' has nothing to find.")
+        occurrences = patched.count(find)
+        if occurrences == 0:
+            raise CVPatchError(f"Passage not found in section '{section}': {find[:60]!r}")
+        if occurrences == 1:
+            position = patched.index(find)
+        else:
+            start = _section_start(patched, section) if section else None
+            position = patched.find(find, start) if start is not None else -1
+            if position == -1:
+                raise CVPatchError(f"Passage is ambiguous and section '{section}' was not found: {find[:60]!r}")
+        patched = patched[:position] + replace + patched[position + len(find):]
+    if len(patched.strip()) < min_length_ratio * len(cv_content.strip()):
+        raise CVPatchError("The patched CV lost too much of the current CV.")
+    return patched
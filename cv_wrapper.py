@@ -1,40 +1,40 @@
 import os,re
 # Assume the required imports from the respective modules (like OpenAIModel, GeminiModel, etc.)
-from cv_info_extractor import load_and_extract_text
 from ai_interaction import OpenAIModel, GeminiModel
 from ai_interaction import OpenAIModel, CVGenerator
 from basic_iterative import BasicIterativeAgent
 from modular_iterative import ModularIterativeAgent
-from cv_info_extractor import extract_information_from_cv
 from docx_generate import generate_cv_document, save_cv_sections_to_file, extract_cv_sections,load_cv_sections_from_file
 import time
 import logging
 
 from parsing_cv_to_dict import CVParserAI
 from dotenv import load_dotenv
-from openai import OpenAI
-from ExtractCompanyNameJob import extract_company_name_and_job_name
+from http_clients import get_openai_client
 from doc_from_template import sections2cv
 from parse_critique_to_dict import parse_cv_critique_to_dict
 from doc_from_template import generate_cv
-
-def critique_original_cv(cv_content, job_description_text, cover_letter_gen_a, critique_file_path, api_key ):
+from llm_cache import LLMResponseCache, CachedLLMModel
+from run_context import RunContext
+from stage_graph import StageGraph
+from llm_events import LLMCall, openai_usage, add_event_hook, remove_event_hook, JSONLEventSink, StageMetricsSink
+
+def critique_original_cv(cv_content, job_description_text, cover_letter_gen_a, critique_file_path, api_key, cache=None,
+                         context=None):
+    if context is None:
+        context = RunContext(api_key, cache)
     critique, grade, grades_dict = cover_letter_gen_a.create_critique(
                 cv_content, cv_content, job_description_text, history=""
             )
-    cv_data = extract_information_from_cv(cv_content, api_key)
-
-    cv_data = {key.strip('"'): value.strip('"').replace(',', '').strip() if isinstance(value, str) else value for
-               key, value in cv_data.items()}
-    company_name_and_job_name = extract_company_name_and_job_name(job_description_text, openai_api_key)
-    company_name_and_job_name = company_name_and_job_name.replace("/", "_")
+    cv_data = context.cv_data(cv_content)
+    company_name_and_job_name = context.company_name_and_job_name(job_description_text)
     print(company_name_and_job_name)
     company_name, job_name = company_name_and_job_name.split("|")
     company_name_and_job_name = company_name_and_job_name.replace("|", "_")
 
     # generate_cv_document(file_name, finalized_cv_content)
     sections_critique = parse_cv_critique_to_dict(critique, "cv_critique" + company_name_and_job_name,
-                                                  cv_data["Full name"])
+                                                  cv_data.get("Full name", "Applicant"))
     sections_critique["job_name"] = job_name
     sections_critique["company_name"] = company_name
     sections_critique['name'] = sections_critique['name'].replace("\"", "")
@@ -51,7 +51,7 @@ def critique_original_cv(cv_content, job_description_text, cover_letter_gen_a, c
 
 
     final_verdict_prompt = create_final_verdict_prompt_v2(sections_critique)
-    client = OpenAI(api_key=openai_api_key)
+    client = get_openai_client(api_key)
     final_verdict = get_response(client, final_verdict_prompt)
     sections_critique["final_verdict"] = final_verdict
     #output_criqique_path = os.path.join("Output", "CV", "CVCritique_" + company_name_and_job_name)
@@ -121,18 +121,21 @@ def get_response(client, prompt, history=None, temperature=0.01,model_name="gpt-
 
     messages.append({"role": "user", "content": prompt})
 
+    call = LLMCall(model_name)
     try:
         completion = client.chat.completions.create(
             model= model_name,
             messages=messages,
             temperature=temperature
         )
+        call.finish(*(openai_usage(completion) or ()))
         response = completion.choices[0].message.content.strip()
         return response
     except Exception as e:
+        call.finish(error=e)
         logging.error(f"An error occurred: {e}")
         return None
-def cv_content_generation(cv_file_path, job_description_text, llm_provider='openai', agent_type='BasicIterativeAgent', agent_module='basic_iterative'):
+def cv_content_generation(cv_file_path, job_description_text, llm_provider='openai', agent_type='BasicIterativeAgent', agent_module='basic_iterative', cache=None, context=None, agent_kwargs=None, critique_mode='text'):
     # Load API key securely
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
@@ -141,26 +144,30 @@ def cv_content_generation(cv_file_path, job_description_text, llm_provider='open
     # Initialize the appropriate AI model based on the llm_provider argument
     if llm_provider == 'openai':
         ai_model = OpenAIModel(api_key=api_key, model_name='gpt-4o')
+        # Missing critique grades are recovered by a small model from the critique text alone
+        repair_model = OpenAIModel(api_key=api_key, model_name='gpt-4o-mini')
     else:
         raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+    if cache is not None:
+        ai_model = CachedLLMModel(ai_model, cache)
+        repair_model = CachedLLMModel(repair_model, cache)
 
     # Initialize the CVGenerator with the chosen AI model
-    cv_gen = CVGenerator(ai_model)
+    cv_gen = CVGenerator(ai_model, critique_mode=critique_mode, repair_model=repair_model)
+
+    if context is None:
+        context = RunContext(api_key, cache)
 
     # Extract text from the CV file
-    cv_text = load_and_extract_text(cv_file_path)
+    cv_text = context.cv_text(cv_file_path)
 
     # Use extract_information_from_cv to get structured data from CV text
-    cv_data = extract_information_from_cv(cv_text,api_key)
-
-    cv_data = {key.strip('"'): value.strip('"').replace(',', '').strip() if isinstance(value, str) else value for key, value in cv_data.items()}
+    cv_data = context.cv_data(cv_text)
 
     #personal_info = cv_data.get('Full name', '') + ", " + cv_data.get('Email', '')
     #job_history = cv_data.get('Professional Summary', 'No job history found')
     #skills = cv_data.get('Key skills', '')
-    print(cv_data)
-    print(cv_data['Full name'])
-    print("#$"*44)
+    logging.debug(f"Extracted CV data for {cv_data.get('Full name', 'Applicant')}: {cv_data}")
     # Dynamically load the agent class from the specified module
     try:
         agent_module_obj = importlib.import_module(agent_module)
@@ -169,11 +176,14 @@ def cv_content_generation(cv_file_path, job_description_text, llm_provider='open
         raise ImportError(f"Could not load agent '{agent_type}' from module '{agent_module}': {e}")
 
     # Initialize the agent dynamically
-    agent = agent_class(cv_gen, max_iterations=4, improvement_threshold=-1.5)
+    # agent_kwargs carries agent-specific options, e.g. {"max_workers": 8} for ModularIterativeAgent
+    agent = agent_class(cv_gen, **{"max_iterations": 4, "improvement_threshold": -1.5, **(agent_kwargs or {})})
 
     # Generate initial CV and perform iterative improvements
     #generated_cv_p = cv_gen.generate_cv(cv_text, job_description_text, cv_text, history=None)
-    generated_cv, final_critique = agent.improve_cv(cv_text, job_description_text)
+    generated_cv, final_critique = agent.improve_cv(
+        cv_text, job_description_text,
+        company_name_and_job_name=context.company_name_and_job_name(job_description_text))
 
     # Output the final improved CV and critique
     print("Final Improved CV:")
@@ -256,75 +266,119 @@ Ensure the dictionary format is valid and follows this example structure:
 }}
 """
     return prompt
-def wrapping_cv_generation(cv_file_path,job_description_text, output_dir,openai_api_key, template_path,agent_type='BasicIterativeAgent', agent_module='basic_iterative'):
-    company_name_and_job_name = extract_company_name_and_job_name(job_description_text, openai_api_key)
-    company_name_and_job_name = company_name_and_job_name.replace("/","_")
-    sections_file_path = os.path.join("Output", "Sections",
-                                      company_name_and_job_name.replace(".", "_").replace("|","_") + agent_type +"_sections.txt")
-    critique_file_path = os.path.join("Output", "CritiqueFinal",
-                                      company_name_and_job_name.replace(".", "_").replace("|","_") + agent_type + "_crtitque.txt")
-    cv_content_final_file_path = os.path.join("Output", "CV_content",
-                                              company_name_and_job_name.replace(".", "_").replace("|","_") + agent_type +"_cv_content.txt")
-    #extract_information_from_cv
-    cv_text = load_and_extract_text(cv_file_path)
-    cv_data2 = extract_information_from_cv(cv_text, openai_api_key)
+def wrapping_cv_generation(cv_file_path,job_description_text, output_dir,openai_api_key, template_path,agent_type='BasicIterativeAgent', agent_module='basic_iterative', use_cache=True, max_workers=4, agent_kwargs=None, critique_mode='text', event_log_path=None):
+    start = time.time()
+    # Low-temperature calls (critiques, extraction, parsing) are served from disk on reruns
+    cache = LLMResponseCache() if use_cache else None
+    # Artifacts needed by several stages (CV text, CV data, company/job) are computed once per run
+    context = RunContext(openai_api_key, cache)
     ai_model = OpenAIModel(api_key=openai_api_key, model_name='gpt-4o')
-
-
+    repair_model = OpenAIModel(api_key=openai_api_key, model_name='gpt-4o-mini')
+    if cache is not None:
+        ai_model = CachedLLMModel(ai_model, cache)
+        repair_model = CachedLLMModel(repair_model, cache)
     # Initialize the CVGenerator with the chosen AI model
-    cv_gen = CVGenerator(ai_model)
-    critique_original_cv_file_path = os.path.join("Output", "CV", "OriginalCVCritique_" + company_name_and_job_name.replace("|","_"))
-    critique_original_cv(cv_text, job_description_text, cv_gen, critique_original_cv_file_path, openai_api_key)
-
-    cv_data2 = {key.strip('"'): value.strip('"').replace(',', '').strip() if isinstance(value, str) else value for
-               key, value in cv_data2.items()}
-    #cv_data['Full name']
-    dest_cv_path = os.path.join("Output", "CV","CV_"+company_name_and_job_name.replace(".", "_").replace("|","_")+"_"+agent_type +cv_data2['Full name'].replace(" ","_").replace("-","_").replace("\"",""))
-    finalized_cv_content, critique_final, cv_data = cv_content_generation(cv_file_path, job_description_text,
-                                                                llm_provider="openai",
-                                                                agent_type=agent_type, agent_module=agent_module)
-    print(company_name_and_job_name)
-    company_name,job_name = company_name_and_job_name.split("|")
-    company_name_and_job_name = company_name_and_job_name.replace("|","_")
-    client = OpenAI(api_key=openai_api_key)
-
+    cv_gen = CVGenerator(ai_model, critique_mode=critique_mode, repair_model=repair_model)
+    client = get_openai_client(openai_api_key)
     # Assume `openai` is the OpenAI client object initialized with your API key
-    parser = CVParserAI(client)
-    sections = parser.parse_cv_sections(finalized_cv_content)
-    save_cv_sections_to_file(sections, sections_file_path)
-    # generate_cv_document(file_name, finalized_cv_content)
-
-    sections_critique = parse_cv_critique_to_dict(critique_final , "cv_critique" + company_name_and_job_name, cv_data["Full name"])
-    sections_critique["job_name"] = job_name
-    sections_critique["company_name"] = company_name
-    sections_critique['name'] = sections_critique['name'].replace("\"","")
-    print(f"Generated CV saved to {sections}")
-    with open(critique_file_path, "w", encoding="utf-8") as f:
-        f.write(f"{critique_final}:\n")
-    with open(cv_content_final_file_path, "w", encoding="utf-8") as f:
-        f.write(f"{finalized_cv_content}:\n")
-    print(sections_critique)
-    sections_critique["FinalGrade"] = [float(section["Grade"]) for section in sections_critique['sections'] if section['Title'].find('Overall Impression')>-1][0]
-    for section in sections_critique['sections']:
-        section['Content'] = section['Content'].replace("Ph.D","PhD").split(".")
-        if len(section["Content"][-1]) < 3:
-            section["Content"] = section["Content"][:-1]
+    parser = CVParserAI(client, cache=cache)
     template_cv_critique_path = os.path.join("Templates", "Critique_CV_Template_v2.docx")
-    print(load_cv_sections_from_file(sections_file_path))
-    sections2cv(template_path, sections_file_path, dest_cv_path)
 
-    final_verdict_prompt = create_final_verdict_prompt_v2(sections_critique)
-    final_verdict = get_response(client, final_verdict_prompt)
-    sections_critique["final_verdict"] = final_verdict
-    output_criqique_path = os.path.join("Output", "CV", "CVCritique_" + company_name_and_job_name)
-    #sections_critique["FinalGrade "] = sections_critique.pop()
-    generate_cv(output_criqique_path, sections_critique, template_cv_critique_path)
-    print(sections_critique)
+    def output_paths(company_job):
+        file_prefix = company_job.replace(".", "_").replace("|", "_") + agent_type
+        return {
+            "sections": os.path.join("Output", "Sections", file_prefix + "_sections.txt"),
+            "critique": os.path.join("Output", "CritiqueFinal", file_prefix + "_crtitque.txt"),
+            "cv_content": os.path.join("Output", "CV_content", file_prefix + "_cv_content.txt"),
+        }
+
+    def original_critique(cv_text, company_job):
+        critique_original_cv_file_path = os.path.join("Output", "CV", "OriginalCVCritique_" + company_job.replace("|","_"))
+        critique_original_cv(cv_text, job_description_text, cv_gen, critique_original_cv_file_path, openai_api_key,
+                             cache=cache, context=context)
+
+    def improved_cv():
+        finalized_cv_content, critique_final, _ = cv_content_generation(cv_file_path, job_description_text,
+                                                                        llm_provider="openai",
+                                                                        agent_type=agent_type, agent_module=agent_module,
+                                                                        cache=cache, context=context,
+                                                                        agent_kwargs=agent_kwargs,
+                                                                        critique_mode=critique_mode)
+        return finalized_cv_content, critique_final
+
+    def sections(improved_cv, company_job):
+        finalized_cv_content, critique_final = improved_cv
+        paths = output_paths(company_job)
+        cv_sections = parser.parse_cv_sections(finalized_cv_content)
+        save_cv_sections_to_file(cv_sections, paths["sections"])
+        print(f"Generated CV saved to {cv_sections}")
+        with open(paths["critique"], "w", encoding="utf-8") as f:
+            f.write(f"{critique_final}:\n")
+        with open(paths["cv_content"], "w", encoding="utf-8") as f:
+            f.write(f"{finalized_cv_content}:\n")
+        return paths["sections"]
+
+    def render_cv(sections, cv_data, company_job):
+        dest_cv_path = os.path.join("Output", "CV","CV_"+company_job.replace(".", "_").replace("|","_")+"_"+agent_type +cv_data.get('Full name', 'Applicant').replace(" ","_").replace("-","_").replace("\"",""))
+        print(load_cv_sections_from_file(sections))
+        sections2cv(template_path, sections, dest_cv_path)
+
+    def critique_report(improved_cv, cv_data, company_job):
+        critique_final = improved_cv[1]
+        print(company_job)
+        company_name,job_name = company_job.split("|")
+        company_name_and_job_name = company_job.replace("|","_")
+        sections_critique = parse_cv_critique_to_dict(critique_final , "cv_critique" + company_name_and_job_name, cv_data.get("Full name", "Applicant"))
+        sections_critique["job_name"] = job_name
+        sections_critique["company_name"] = company_name
+        sections_critique['name'] = sections_critique['name'].replace("\"","")
+        print(sections_critique)
+        sections_critique["FinalGrade"] = [float(section["Grade"]) for section in sections_critique['sections'] if section['Title'].find('Overall Impression')>-1][0]
+        for section in sections_critique['sections']:
+            section['Content'] = section['Content'].replace("Ph.D","PhD").split(".")
+            if len(section["Content"][-1]) < 3:
+                section["Content"] = section["Content"][:-1]
+
+        final_verdict_prompt = create_final_verdict_prompt_v2(sections_critique)
+        final_verdict = get_response(client, final_verdict_prompt)
+        sections_critique["final_verdict"] = final_verdict
+        output_criqique_path = os.path.join("Output", "CV", "CVCritique_" + company_name_and_job_name)
+        generate_cv(output_criqique_path, sections_critique, template_cv_critique_path)
+        print(sections_critique)
+
+    # The original-CV critique, the iterative improvement and the extractions do not depend on
+    # each other and run concurrently; rendering and the final verdict join on their results.
+    graph = StageGraph()
+    graph.add_stage("company_job", lambda: context.company_name_and_job_name(job_description_text))
+    graph.add_stage("cv_text", lambda: context.cv_text(cv_file_path))
+    graph.add_stage("cv_data", lambda cv_text: context.cv_data(cv_text), depends_on=("cv_text",))
+    graph.add_stage("original_critique", original_critique, depends_on=("cv_text", "company_job"))
+    graph.add_stage("improved_cv", improved_cv)
+    graph.add_stage("sections", sections, depends_on=("improved_cv", "company_job"))
+    graph.add_stage("render_cv", render_cv, depends_on=("sections", "cv_data", "company_job"))
+    graph.add_stage("critique_report", critique_report, depends_on=("improved_cv", "cv_data", "company_job"))
+    # Every LLM request of the run is aggregated per stage, and logged as JSON lines if asked
+    metrics = StageMetricsSink()
+    hooks = [metrics] + ([JSONLEventSink(event_log_path)] if event_log_path else [])
+    for hook in hooks:
+        add_event_hook(hook)
+    try:
+        graph.run(max_workers=max_workers)
+    finally:
+        for hook in hooks:
+            remove_event_hook(hook)
+        if cache is not None:
+            cache.close()
+        print(metrics.report())
     print("total time %0.2f" % (time.time() - start))
 
 
-
 if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="Generate an improved CV for a job description.")
+    arg_parser.add_argument("--critique-mode", choices=("text", "structured"), default="text",
+                            help="'structured' requests the critique as JSON with typed grades.")
+    args = arg_parser.parse_args()
     start = time.time()
     #cv_file_path = os.path.join("Data", 'CV_GPT_rev.pdf')
     cv_file_path = os.path.join("Data","CV", 'CV_GPT_N6.pdf')
@@ -343,7 +397,8 @@ if __name__ == "__main__":
     job_description_text = open(job_description_text_file_path,"r",encoding="utf-8").read()
     #print(job_description_text)
     #wrapping_cv_generation(cv_file_path, job_description_text, output_dir, openai_api_key,template_path, "ModularIterativeAgent", "modular_iterative")
-    wrapping_cv_generation(cv_file_path, job_description_text, output_dir, openai_api_key, template_path,"BasicIterativeAgent", "basic_iterative")
+    wrapping_cv_generation(cv_file_path, job_description_text, output_dir, openai_api_key, template_path,"BasicIterativeAgent", "basic_iterative",
+                           critique_mode=args.critique_mode)
     # Set up OpenAI client
     print("Total time : %0.2f" %(time.time() -start))
     """ 
@@ -1,35 +1,170 @@
 # data_handling.py
 
-from PyPDF2 import PdfReader
 import os
+import threading
 from pdfminer.high_level import extract_text
+from pdf_text_cache import PDFTextCache
 
-def load_and_extract_text(file_path):
+DEFAULT_PDF_BACKEND = "pdfminer"
+
+_text_cache = None
+_text_cache_lock = threading.Lock()
+
+
+def get_pdf_text_cache():
+    """
+    Return the process-wide PDF text cache, creating it on first use.
     """
-    Load a PDF file and extract its text content using pdfminer.six.
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            _text_cache = PDFTextCache()
+        return _text_cache
+
+
+# Every backend returns the text of the whole document with each page ended by a form feed,
+# as pdfminer.six does, so callers and the text cache do not depend on the backend. The page
+# iterators yield the same text one page at a time, as each page is decoded.
+
+def _extract_pdfminer(file_path):
+    return extract_text(file_path)
+
+
+def _iter_pages_pdfminer(file_path):
+    # Same pipeline as pdfminer's extract_text, with the output drained after every page
+    from io import StringIO
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    with open(file_path, "rb") as fp, StringIO() as output:
+        resources = PDFResourceManager()
+        device = TextConverter(resources, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resources, device)
+        for page in PDFPage.get_pages(fp):
+            interpreter.process_page(page)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+
+
+def _pdfminer_version():
+    import pdfminer
+    return f"pdfminer.six-{pdfminer.__version__}"
+
+
+def _iter_pages_pypdf(file_path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    for page in PdfReader(file_path).pages:
+        yield (page.extract_text() or "") + "\f"
+
+
+def _extract_pypdf(file_path):
+    return "".join(_iter_pages_pypdf(file_path))
+
+
+def _pypdf_version():
+    try:
+        import pypdf
+    except ImportError:
+        import PyPDF2 as pypdf
+    return f"{pypdf.__name__}-{pypdf.__version__}"
+
+
+def _iter_pages_pymupdf(file_path):
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as document:
+        for page in document:
+            yield page.get_text() + "\f"
+
+
+def _extract_pymupdf(file_path):
+    return "".join(_iter_pages_pymupdf(file_path))
+
+
+def _pymupdf_version():
+    import fitz
+    return f"pymupdf-{fitz.VersionBind}"
+
+
+# Backend name -> (text extractor, version of the library, part of the text cache key)
+PDF_BACKENDS = {
+    "pdfminer": (_extract_pdfminer, _pdfminer_version),
+    "pypdf": (_extract_pypdf, _pypdf_version),
+    "pymupdf": (_extract_pymupdf, _pymupdf_version),
+}
+
+PDF_PAGE_ITERATORS = {
+    "pdfminer": _iter_pages_pdfminer,
+    "pypdf": _iter_pages_pypdf,
+    "pymupdf": _iter_pages_pymupdf,
+}
+
+
+def pdf_extractor_version(backend=DEFAULT_PDF_BACKEND):
+    """
+    Return the name and library version of a PDF backend, e.g. 'pdfminer.six-20231228'.
+    """
+    return PDF_BACKENDS[backend][1]()
+
+
+def load_and_extract_text(file_path, use_cache=True, backend=None):
+    """
+    Load a PDF file and extract its text content.
+
+    Texts are cached on disk by file content, so a CV parsed for many jobs is only
+    extracted once.
 
     Args:
         file_path (str): The path to the PDF file.
+        use_cache (bool): Serve and store the text in the PDF text cache.
+        backend (str): 'pdfminer' (pdfminer.six), 'pypdf' or 'pymupdf'; DEFAULT_PDF_BACKEND if None.
 
     Returns:
-        str: The extracted text from the PDF.
+        str: The extracted text from the PDF, each page ended by a form feed.
+    """
+    backend = backend or DEFAULT_PDF_BACKEND
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{backend}', expected one of {sorted(PDF_BACKENDS)}.")
+    extract = PDF_BACKENDS[backend][0]
+    if not use_cache:
+        return extract(file_path)
+    return get_pdf_text_cache().get_or_extract(file_path, pdf_extractor_version(backend), extract)
+
+
+def iter_pdf_pages(file_path, use_cache=True, backend=None):
+    """
+    Yield the text of a PDF one page at a time, as each page is decoded.
+
+    A consumer that only needs the first page stops the extraction by not asking for more.
+    When the whole text is already in the PDF text cache its pages are yielded from there;
+    pages read this way are not added to the cache, since the document may not be read to the end.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        use_cache (bool): Serve the pages from the PDF text cache when the text is there.
+        backend (str): 'pdfminer' (pdfminer.six), 'pypdf' or 'pymupdf'; DEFAULT_PDF_BACKEND if None.
+
+    Yields:
+        str: The text of each page, ended by a form feed as in load_and_extract_text.
     """
-    text = extract_text(file_path)
-    return text
-""" 
-def load_and_extract_text(file_path):
-    
-    with open(file_path, 'rb') as file:
-        pdf_reader = PdfReader(file)
-        text = ""
-        print("num of pages",len(pdf_reader.pages))
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            print(page_text)
-            text += page_text #page.extract_text()
-
-    return text
-"""
+    backend = backend or DEFAULT_PDF_BACKEND
+    if backend not in PDF_PAGE_ITERATORS:
+        raise ValueError(f"Unknown PDF backend '{backend}', expected one of {sorted(PDF_PAGE_ITERATORS)}.")
+    if use_cache:
+        cache = get_pdf_text_cache()
+        text = cache.get(cache.content_hash(file_path), pdf_extractor_version(backend))
+        if text is not None:
+            pages = text.split("\f")
+            if not pages[-1]:
+                pages.pop()
+            for page in pages:
+                yield page + "\f"
+            return
+    yield from PDF_PAGE_ITERATORS[backend](file_path)
 
 def extract_applicant_name(cv_text):
     """
@@ -50,6 +185,23 @@ def extract_applicant_name(cv_text):
     else:
         return "Applicant"
 
+
+def extract_applicant_name_from_pdf(file_path, backend=None):
+    """
+    Extract the applicant's name from a CV file, decoding only its first page.
+
+    Args:
+        file_path (str): The path to the PDF file.
+        backend (str): The PDF backend; DEFAULT_PDF_BACKEND if None.
+
+    Returns:
+        str: The applicant's name.
+    """
+    for page in iter_pdf_pages(file_path, backend=backend):
+        if page.strip():
+            return extract_applicant_name(page)
+    return "Applicant"
+
 # Testing functions
 if __name__ == '__main__':
     """
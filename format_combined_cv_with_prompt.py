@@ -23,23 +23,18 @@ def parse_skills_section(skills_raw):
 
     return skills_dict
 
-def format_combined_cv_with_prompt(structured_cv):
-    """
-    Formats a structured CV dictionary into a professional CV using a Jinja2 template.
-    Args:
-        structured_cv (dict): A dictionary containing structured CV data.
-    Returns:
-        str: The formatted CV as a string.
-    """
-    # Ensure the Skills section is correctly parsed into a dictionary
-    if isinstance(structured_cv.get("Skills"), list):
-        structured_cv["Skills"] = parse_skills_section(structured_cv["Skills"])
-    print("=====")
-    for key in structured_cv.keys():
-        print(key)
-        print(">"*88)
-        print(structured_cv[key])
-    prompt_template = """
+# Entry fields the template places explicitly; any other non-empty field of an entry is
+# rendered after it as "Field: value", so nothing the parser extracted is dropped
+EXPERIENCE_FIELDS = ("Title", "Company", "Employer", "WorkPlace", "Location", "Duration", "Responsibilities")
+EDUCATION_FIELDS = ("Degree", "Institution", "Year", "Thesis")
+PROJECT_FIELDS = ("Title", "Description", "Link")
+
+CV_TEMPLATE = """
+{%- macro extra_fields(entry, known) -%}
+{% for field, value in entry.items() if field not in known and value %}  
+ {{field}}: {{ value if value is string else value|join(", ") }}  
+{%- endfor %}
+{%- endmacro -%}
 {{Name}}  
 Contact Information  
  Phone: {{Contact.Phone}} | Email: {{Contact.Email}}  
@@ -51,7 +46,7 @@ Summary
 
 Work Experience  
 {% for job in Experience %}  
-• {{job.Title}} | ({{job.Duration}})  
+• {{job.Title}}{% for field in ("Company", "Employer", "WorkPlace", "Location") if job[field] %} | {{job[field]}}{% endfor %} | ({{job.Duration}}){{ extra_fields(job, experience_fields) }}  
 {% for resp in job.Responsibilities %}  
  {{resp}}  
 {% endfor %}  
@@ -59,17 +54,17 @@ Work Experience
 
 Skills  
 {% for category, category_skills in Skills.items() %}  
-• {{category}}: {% for skill in category_skills %} {{skill}} {% endfor %}  
+• {{category}}: {{ category_skills if category_skills is string else category_skills|join(", ") }}  
 {% endfor %}  
 
 Education  
 {% for edu in Education %}  
-• {{edu.Degree}} | {{edu.Institution}} | {{edu.Year}} {% if edu.Thesis %} | {{edu.Thesis}} {% endif %}  
+• {{edu.Degree}} | {{edu.Institution}} | {{edu.Year}} {% if edu.Thesis %} | {{edu.Thesis}} {% endif %}{{ extra_fields(edu, education_fields) }}  
 {% endfor %}  
 
 Projects  
 {% for project in Projects %}  
-• {{project.Title}}: {{project.Description}}  
+• {{project.Title}}: {{project.Description}}{{ extra_fields(project, project_fields) }}  
 {% if project.Link %}  
  Link: {{project.Link}}  
 {% endif %}  
@@ -81,11 +76,70 @@ Publications
 {% endfor %}
     """
 
+# Compiled on first use and reused, so rendering costs no more than filling the template
+_compiled_template = None
+
+
+def is_template_compatible(structured_cv):
+    """
+    Check that a structured CV has the shapes the template iterates over.
+
+    Args:
+        structured_cv (dict): A dictionary containing structured CV data.
+
+    Returns:
+        bool: True if the CV can be rendered by format_combined_cv_with_prompt.
+    """
+    if not isinstance(structured_cv, dict):
+        return False
+    if not isinstance(structured_cv.get("Contact", {}), dict):
+        return False
+    for key in ("Experience", "Education", "Projects"):
+        entries = structured_cv.get(key, [])
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            return False
+    for job in structured_cv.get("Experience", []):
+        if not isinstance(job.get("Responsibilities", []), list):
+            return False
+    skills = structured_cv.get("Skills", {})
+    if not isinstance(skills, (dict, list)):
+        return False
+    if isinstance(skills, dict) and not all(isinstance(value, (str, list)) for value in skills.values()):
+        return False
+    return isinstance(structured_cv.get("Publications", []), list)
+
+
+def format_combined_cv_with_prompt(structured_cv, verbose=True):
+    """
+    Formats a structured CV dictionary into a professional CV using a Jinja2 template.
+    Args:
+        structured_cv (dict): A dictionary containing structured CV data.
+        verbose (bool): Print the sections and the rendered CV.
+    Returns:
+        str: The formatted CV as a string.
+    """
+    global _compiled_template
+    # Ensure the Skills section is correctly parsed into a dictionary
+    if isinstance(structured_cv.get("Skills"), list):
+        structured_cv["Skills"] = parse_skills_section(structured_cv["Skills"])
+    for key in ("Name", "Summary"):
+        if isinstance(structured_cv.get(key), list):
+            structured_cv[key] = " ".join(str(item) for item in structured_cv[key])
+    if verbose:
+        print("=====")
+        for key in structured_cv.keys():
+            print(key)
+            print(">"*88)
+            print(structured_cv[key])
+
     try:
         # Load and render the template
-        template = Template(prompt_template)
-        formatted_cv = template.render(**structured_cv)
-        print(formatted_cv)
+        if _compiled_template is None:
+            _compiled_template = Template(CV_TEMPLATE)
+        formatted_cv = _compiled_template.render(**structured_cv, experience_fields=EXPERIENCE_FIELDS,
+                                                 education_fields=EDUCATION_FIELDS, project_fields=PROJECT_FIELDS)
+        if verbose:
+            print(formatted_cv)
         return formatted_cv.strip()
     except Exception as e:
         return f"Error generating CV: {str(e)}"
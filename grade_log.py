@@ -0,0 +1,116 @@
+# grade_log.py
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_GRADE_LOG_PATH = os.path.join("Output", "Grades", "grades.sqlite")
+
+
+class GradeLog:
+    """
+    Append-only log of the critique grades of every agent run, stored in SQLite.
+
+    Each grade is one row (run, iteration, criterion, grade) committed as soon as it is
+    logged, so a run that stops early or fails keeps every grade it produced. Runs from
+    many processes can share the log and be queried together.
+    """
+
+    def __init__(self, path=DEFAULT_GRADE_LOG_PATH):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            # Lets other processes read the log while a run appends to it
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                agent TEXT,
+                company_job TEXT,
+                started_at REAL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS grades (
+                run_id TEXT,
+                iteration INTEGER,
+                criterion TEXT,
+                grade REAL,
+                logged_at REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_run ON grades (run_id, iteration)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_criterion ON grades (criterion)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_company_job ON runs (agent, company_job)")
+        self._conn.commit()
+
+    def start_run(self, agent, company_job):
+        """
+        Register a new run.
+
+        Args:
+            agent (str): The agent class name.
+            company_job (str): The company and job the CV is improved for.
+
+        Returns:
+            str: The run id to log the grades of the run under.
+        """
+        run_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO runs (run_id, agent, company_job, started_at) VALUES (?, ?, ?, ?)",
+                               (run_id, agent, company_job, time.time()))
+            self._conn.commit()
+        return run_id
+
+    def log(self, run_id, iteration, grades):
+        """
+        Append the grades of one iteration.
+
+        Args:
+            run_id (str): The id returned by start_run.
+            iteration (int): The iteration number.
+            grades (dict): Grade by criterion name.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO grades (run_id, iteration, criterion, grade, logged_at) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, iteration, criterion, grade, now) for criterion, grade in grades.items()])
+            self._conn.commit()
+
+    def run_grades(self, run_id):
+        """
+        Return the grades of a run as one dictionary per iteration, in iteration order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT iteration, criterion, grade FROM grades WHERE run_id = ? ORDER BY iteration, rowid",
+                (run_id,)).fetchall()
+        iterations = {}
+        for iteration, criterion, grade in rows:
+            iterations.setdefault(iteration, {"iteration": iteration})[criterion] = grade
+        return list(iterations.values())
+
+    def runs(self, agent=None, company_job=None):
+        """
+        Return the runs, newest first, optionally filtered by agent and company/job.
+
+        Returns:
+            list: (run_id, agent, company_job, started_at) tuples.
+        """
+        query = "SELECT run_id, agent, company_job, started_at FROM runs WHERE 1 = 1"
+        params = []
+        if agent is not None:
+            query += " AND agent = ?"
+            params.append(agent)
+        if company_job is not None:
+            query += " AND company_job = ?"
+            params.append(company_job)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY started_at DESC", params).fetchall()
@@ -0,0 +1,121 @@
+# http_clients.py
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+# Pool limits shared by every client created through this module
+pool_settings = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+}
+
+_lock = threading.Lock()
+_openai_clients = {}
+_async_openai_clients = weakref.WeakKeyDictionary()
+_http_session = None
+
+
+def configure_http_pool(max_connections=None, max_keepalive_connections=None, keepalive_expiry=None):
+    """
+    Tune the connection pool limits. Only clients created after the call are affected,
+    so call it once at start-up, before the first request.
+
+    Args:
+        max_connections (int): Maximum number of concurrent connections per client.
+        max_keepalive_connections (int): Maximum number of idle connections kept alive.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+    """
+    if max_connections is not None:
+        pool_settings["max_connections"] = max_connections
+    if max_keepalive_connections is not None:
+        pool_settings["max_keepalive_connections"] = max_keepalive_connections
+    if keepalive_expiry is not None:
+        pool_settings["keepalive_expiry"] = keepalive_expiry
+
+
+def http2_available():
+    """
+    Return True if the optional 'h2' package is installed, which httpx needs for HTTP/2.
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _limits():
+    return httpx.Limits(**pool_settings)
+
+
+def get_openai_client(api_key=None):
+    """
+    Return the process-wide OpenAI client for ``api_key``, creating it on first use.
+
+    The client keeps its connections alive between requests, so only the first call
+    pays for the TCP and TLS handshake.
+
+    Args:
+        api_key (str): The OpenAI API key; defaults to the OPENAI_API_KEY environment variable.
+
+    Returns:
+        openai.OpenAI: The shared client.
+    """
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            http_client = openai.DefaultHttpxClient(limits=_limits(), http2=http2_available())
+            client = openai.OpenAI(api_key=api_key, http_client=http_client)
+            _openai_clients[api_key] = client
+        return client
+
+
+def get_async_openai_client(api_key=None):
+    """
+    Return the shared AsyncOpenAI client for ``api_key`` in the running event loop.
+
+    Async connections cannot be shared between event loops, so one client is kept per loop.
+
+    Args:
+        api_key (str): The OpenAI API key; defaults to the OPENAI_API_KEY environment variable.
+
+    Returns:
+        openai.AsyncOpenAI: The shared client.
+    """
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_openai_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            http_client = openai.DefaultAsyncHttpxClient(limits=_limits(), http2=http2_available())
+            client = openai.AsyncOpenAI(api_key=api_key, http_client=http_client)
+            clients[api_key] = client
+        return client
+
+
+def get_http_session():
+    """
+    Return the process-wide requests session used for raw HTTP calls.
+
+    Returns:
+        requests.Session: A session whose adapter pools keep-alive connections.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_settings["max_keepalive_connections"],
+                                  pool_maxsize=pool_settings["max_connections"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
@@ -0,0 +1,182 @@
+# ingest_cvs.py
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data_handling import DEFAULT_PDF_BACKEND, PDF_BACKENDS, load_and_extract_text, extract_applicant_name
+
+DEFAULT_INGEST_PATH = os.path.join("Output", "Ingest", "cvs.sqlite")
+
+
+class CVStore:
+    """
+    Indexed SQLite store of ingested CVs: path, content hash, applicant name and text.
+
+    Each path is stored with the mtime and size it was ingested at, so a rerun over the
+    same directory only extracts new or modified files.
+    """
+
+    def __init__(self, path=DEFAULT_INGEST_PATH):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cvs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                sha256 TEXT,
+                applicant_name TEXT,
+                pages INTEGER,
+                text TEXT,
+                error TEXT,
+                ingested_at REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cvs_sha256 ON cvs (sha256)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cvs_applicant_name ON cvs (applicant_name)")
+        self._conn.commit()
+
+    def is_current(self, path, stat):
+        """
+        Whether a file is stored, without error, with its current mtime and size.
+        """
+        row = self._conn.execute("SELECT mtime_ns, size, error FROM cvs WHERE path = ?", (path,)).fetchone()
+        return row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size and row[2] is None
+
+    def add_many(self, records):
+        """
+        Insert or replace ingested CVs, given as dictionaries with the columns of the table.
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO cvs (path, mtime_ns, size, sha256, applicant_name, pages, text, error, ingested_at)"
+            " VALUES (:path, :mtime_ns, :size, :sha256, :applicant_name, :pages, :text, :error, :ingested_at)",
+            [dict(record, ingested_at=now) for record in records])
+        self._conn.commit()
+
+    def find_by_name(self, applicant_name):
+        """
+        Return the paths of the CVs of an applicant.
+        """
+        return [row[0] for row in self._conn.execute("SELECT path FROM cvs WHERE applicant_name = ?",
+                                                     (applicant_name,))]
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM cvs").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def _is_current(store, path):
+    try:
+        return store.is_current(path, os.stat(path))
+    except OSError:
+        # Gone since the directory was listed; ingest_file records the error
+        return False
+
+
+def ingest_file(path, backend=DEFAULT_PDF_BACKEND):
+    """
+    Extract the text and applicant name of one PDF. Runs in a worker process.
+
+    Returns:
+        dict: A record for CVStore.add_many; a failed extraction has its error set.
+    """
+    record = {"path": path, "mtime_ns": None, "size": None, "sha256": None,
+              "applicant_name": None, "pages": 0, "text": None, "error": None}
+    try:
+        # A file that vanished or cannot be read is recorded as failed instead of stopping the run
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        record.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=sha256)
+        # The store is the cache of a bulk run; the per-file text cache would only add writes
+        text = load_and_extract_text(path, use_cache=False, backend=backend)
+        record.update(text=text, pages=text.count("\f"), applicant_name=extract_applicant_name(text))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def ingest_directory(directory, store, backend=DEFAULT_PDF_BACKEND, max_workers=None, chunksize=None,
+                     batch_size=200, force=False):
+    """
+    Ingest every PDF under a directory into a store, extracting on a process pool.
+
+    Args:
+        directory (str): Directory searched recursively for PDF files.
+        store (CVStore): The store to write to.
+        backend (str): The PDF text backend.
+        max_workers (int): Number of worker processes; the number of CPUs if None.
+        chunksize (int): Files sent to a worker per task; by default the files are split in
+            about four chunks per worker, which keeps the inter-process overhead low.
+        batch_size (int): Records written per transaction.
+        force (bool): Re-extract files already stored with the same mtime and size.
+
+    Returns:
+        dict: Counts of ingested, skipped and failed files and the elapsed seconds.
+    """
+    start = time.time()
+    paths = sorted(os.path.abspath(path) for path in
+                   glob.glob(os.path.join(directory, "**", "*.pdf"), recursive=True))
+    todo = paths if force else [path for path in paths if not _is_current(store, path)]
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(todo) // (max_workers * 4))
+    ingested = failed = 0
+    batch = []
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for record in pool.map(ingest_file, todo, [backend] * len(todo), chunksize=chunksize):
+                if record["error"] is not None:
+                    failed += 1
+                    logging.error(f"Failed to ingest {record['path']}: {record['error']}")
+                else:
+                    ingested += 1
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    store.add_many(batch)
+                    batch = []
+    finally:
+        # Keep what was extracted even if the run is interrupted
+        if batch:
+            store.add_many(batch)
+    return {"ingested": ingested, "skipped": len(paths) - len(todo), "failed": failed,
+            "seconds": round(time.time() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the text and applicant name of every CV PDF in a directory.")
+    parser.add_argument("directory", help="Directory searched recursively for PDF files.")
+    parser.add_argument("--store", default=DEFAULT_INGEST_PATH, help="Path of the SQLite store.")
+    parser.add_argument("--backend", default=DEFAULT_PDF_BACKEND, choices=list(PDF_BACKENDS))
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--chunksize", type=int, default=None, help="Files per worker task.")
+    parser.add_argument("--force", action="store_true", help="Re-extract files that are already stored.")
+    args = parser.parse_args()
+
+    store = CVStore(args.store)
+    try:
+        result = ingest_directory(args.directory, store, backend=args.backend, max_workers=args.workers,
+                                  chunksize=args.chunksize, force=args.force)
+    finally:
+        store.close()
+    print(f"Ingested {result['ingested']}, skipped {result['skipped']}, failed {result['failed']} "
+          f"in {result['seconds']:.2f}s -> {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# llm_cache.py
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from ai_interaction import LLMModel
+from llm_events import LLMCall, cache_status
+
+DEFAULT_CACHE_PATH = os.path.join("Output", "Cache", "llm_cache.sqlite")
+
+
+class LLMResponseCache:
+    """
+    Disk-backed, content-addressed cache of LLM responses stored in SQLite.
+
+    Entries are keyed by a hash of (model, messages, temperature), expire after a TTL
+    and are evicted least-recently-used first once the cache holds more than
+    ``max_entries`` responses.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=7 * 24 * 3600, max_entries=10000):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+            ttl_seconds (float): Time to live of an entry; None keeps entries forever.
+            max_entries (int): Maximum number of entries kept before LRU eviction.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, messages, temperature):
+        """
+        Build the content hash identifying a request.
+
+        Args:
+            model_name (str): The model name.
+            messages (list): The full list of messages sent to the model.
+            temperature (float): The sampling temperature.
+
+        Returns:
+            str: A SHA-256 hex digest.
+        """
+        payload = json.dumps({"model": model_name, "messages": messages, "temperature": temperature},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached response for ``key`` or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key, response, model_name=""):
+        """
+        Store a response and evict the least recently used entries above ``max_entries``.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now))
+            if self.max_entries is not None:
+                self._conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )""", (self.max_entries,))
+            self._conn.commit()
+
+    def delete(self, key):
+        """
+        Remove the entry for ``key``, e.g. a response the caller rejected.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the SQLite connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def _default_temperature(get_response):
+    parameter = inspect.signature(get_response).parameters.get("temperature")
+    if parameter is None or parameter.default is inspect.Parameter.empty:
+        return None
+    return parameter.default
+
+
+class CachedLLMModel(LLMModel):
+    """
+    LLMModel wrapper that serves repeated requests from an LLMResponseCache.
+
+    Calls made with a temperature above ``max_temperature`` are sampled for variety and
+    always go to the wrapped model.
+    """
+
+    def __init__(self, ai_model, cache=None, max_temperature=0.5):
+        """
+        Args:
+            ai_model (LLMModel): The model to wrap.
+            cache (LLMResponseCache): The cache to use; a default on-disk cache is created if None.
+            max_temperature (float): Calls above this temperature bypass the cache.
+        """
+        self.ai_model = ai_model
+        self.cache = cache if cache is not None else LLMResponseCache()
+        self.max_temperature = max_temperature
+        self.model_name = getattr(ai_model, "model_name", type(ai_model).__name__)
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (api_key, client, ...) to existing callers.
+        if name == "ai_model":
+            raise AttributeError(name)
+        return getattr(self.ai_model, name)
+
+    def add_usage_listener(self, listener):
+        self.ai_model.add_usage_listener(listener)
+
+    def remove_usage_listener(self, listener):
+        self.ai_model.remove_usage_listener(listener)
+
+    def _cache_key(self, prompt, history, temperature):
+        if temperature is None or temperature > self.max_temperature:
+            return None
+        if hasattr(self.ai_model, "_build_messages"):
+            messages = self.ai_model._build_messages(prompt, history)
+        else:
+            messages = list(history or []) + [{"role": "user", "content": prompt}]
+        return LLMResponseCache.make_key(self.model_name, messages, temperature)
+
+    def _cache_hit(self, key):
+        """
+        Return the cached response for a key, or None; a hit is reported as an LLM call event.
+        """
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.info(f"LLM cache hit for {self.model_name}")
+            LLMCall(self.model_name, cache="hit").finish()
+        return cached
+
+    def get_response(self, prompt, history=None, temperature=None):
+        """
+        Get the response from the cache, or from the wrapped model on a miss.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            history (list): A list of previous messages (dictionaries with 'role' and 'content').
+            temperature (float): The temperature; None uses the wrapped model's default.
+
+        Returns:
+            str: The response from the model.
+        """
+        if temperature is None:
+            temperature = _default_temperature(self.ai_model.get_response)
+        key = self._cache_key(prompt, history, temperature)
+        cached = self._cache_hit(key)
+        if cached is not None:
+            return cached
+        with cache_status("bypass" if key is None else "miss"):
+            response = self.ai_model.get_response(prompt, history=history, temperature=temperature)
+        if key is not None and response is not None:
+            self.cache.set(key, response, self.model_name)
+        return response
+
+    def invalidate(self, prompt, history=None, temperature=None):
+        """
+        Remove the cached response of a request the caller rejected, so that asking again
+        reaches the wrapped model instead of returning the same response.
+        """
+        if temperature is None:
+            temperature = _default_temperature(self.ai_model.get_response)
+        key = self._cache_key(prompt, history, temperature)
+        if key is not None:
+            self.cache.delete(key)
+
+    async def aget_response(self, prompt, history=None, temperature=None):
+        """
+        Async version of get_response.
+        """
+        if temperature is None:
+            temperature = _default_temperature(self.ai_model.get_response)
+        key = self._cache_key(prompt, history, temperature)
+        cached = self._cache_hit(key)
+        if cached is not None:
+            return cached
+        with cache_status("bypass" if key is None else "miss"):
+            response = await self.ai_model.aget_response(prompt, history=history, temperature=temperature)
+        if key is not None and response is not None:
+            self.cache.set(key, response, self.model_name)
+        return response
+
+    def stream_response(self, prompt, history=None, temperature=None):
+        """
+        Stream the response of the wrapped model, or yield the cached response as one chunk.
+
+        A streamed response is cached only when it was read to the end and the wrapped
+        model confirmed it is complete; a truncated or failed stream is never cached.
+        """
+        if temperature is None:
+            temperature = _default_temperature(self.ai_model.get_response)
+        key = self._cache_key(prompt, history, temperature)
+        cached = self._cache_hit(key)
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        stream = self.ai_model.stream_response(prompt, history=history, temperature=temperature)
+        try:
+            while True:
+                # Only the wrapped stream sees the cache status, not the consumer between chunks
+                with cache_status("bypass" if key is None else "miss"):
+                    try:
+                        chunk = next(stream)
+                    except StopIteration as stop:
+                        completed = bool(stop.value)
+                        break
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            stream.close()
+        if key is not None and chunks and completed:
+            self.cache.set(key, "".join(chunks).strip(), self.model_name)
+        return completed
+
+    def _structured_cache_key(self, prompt, schema, history, temperature):
+        key = self._cache_key(prompt, history, temperature)
+        if key is None:
+            return None
+        return LLMResponseCache.make_key(self.model_name, [{"role": "schema", "content": key},
+                                                           {"role": "schema", "content": json.dumps(schema, sort_keys=True)}],
+                                         temperature)
+
+    def get_structured_response(self, prompt, schema, history=None, temperature=0.01, schema_name="response"):
+        """
+        Get the structured response from the cache, or from the wrapped model on a miss.
+        """
+        key = self._structured_cache_key(prompt, schema, history, temperature)
+        cached = self._cache_hit(key)
+        if cached is not None:
+            return json.loads(cached)
+        with cache_status("bypass" if key is None else "miss"):
+            payload = self.ai_model.get_structured_response(prompt, schema, history=history, temperature=temperature,
+                                                            schema_name=schema_name)
+        if key is not None and payload is not None:
+            self.cache.set(key, json.dumps(payload, ensure_ascii=False), self.model_name)
+        return payload
+
+    def invalidate_structured(self, prompt, schema, history=None, temperature=0.01):
+        """
+        Remove a cached structured response the caller rejected, such as one that failed
+        validation, so asking again reaches the wrapped model.
+        """
+        key = self._structured_cache_key(prompt, schema, history, temperature)
+        if key is not None:
+            self.cache.delete(key)
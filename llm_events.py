@@ -0,0 +1,219 @@
+# llm_events.py
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from budget import estimate_cost
+
+_hooks = []
+_hooks_lock = threading.Lock()
+_stage = contextvars.ContextVar("llm_stage", default=None)
+_cache_status = contextvars.ContextVar("llm_cache_status", default=None)
+
+
+def add_event_hook(hook):
+    """
+    Register ``hook(event)``, called with the event dictionary of every LLM request.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_event_hook(hook):
+    """
+    Unregister a hook added with add_event_hook.
+    """
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit_event(event):
+    """
+    Send an event to every hook; a failing hook is logged and does not affect the request.
+    """
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception as e:
+            logging.error(f"LLM event hook {hook!r} failed: {e}")
+
+
+@contextlib.contextmanager
+def llm_stage(name):
+    """
+    Label the LLM requests made inside the block with a stage name. Nested stages are
+    joined with '/', e.g. 'improved_cv/critique'.
+    """
+    outer = _stage.get()
+    token = _stage.set(f"{outer}/{name}" if outer else name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+@contextlib.contextmanager
+def cache_status(status):
+    """
+    Mark the requests made inside the block with a response-cache status ('miss' or 'bypass').
+    """
+    token = _cache_status.set(status)
+    try:
+        yield
+    finally:
+        _cache_status.reset(token)
+
+
+def openai_usage(response):
+    """
+    Return the (prompt, completion, cached) tokens of an OpenAI completion or stream chunk,
+    or None when it carries no usage.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return usage.prompt_tokens, usage.completion_tokens, getattr(details, "cached_tokens", 0) or 0
+
+
+class LLMCall:
+    """
+    Instrumentation of one LLM request: times it, counts its attempts and emits its event.
+
+    The stage and response-cache status are taken from the context the request is made in.
+    """
+
+    def __init__(self, model_name, cache=None):
+        """
+        Args:
+            model_name (str): The model the request is sent to.
+            cache (str): Response-cache status ('hit', 'miss', 'bypass'); defaults to the context's.
+        """
+        self.model_name = model_name
+        self.stage = _stage.get()
+        self.cache = cache if cache is not None else _cache_status.get()
+        self.attempts = 0
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def counted(self, request):
+        """
+        Wrap a zero-argument request so that every attempt of it is counted.
+        """
+        def attempt():
+            self.attempts += 1
+            return request()
+        return attempt
+
+    def finish(self, prompt_tokens=0, completion_tokens=0, cached_tokens=0, error=None):
+        """
+        Emit the event of the request; later calls are ignored.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        emit_event({
+            "event": "llm_call",
+            "timestamp": time.time(),
+            "model": self.model_name,
+            "stage": self.stage,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "cached_tokens": cached_tokens or 0,
+            "latency": time.perf_counter() - self._start,
+            "retries": max(self.attempts - 1, 0),
+            "cache": self.cache,
+            "error": None if error is None else f"{type(error).__name__}: {error}",
+        })
+
+
+class JSONLEventSink:
+    """
+    Hook that appends every event as one JSON line to a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+class StageMetricsSink:
+    """
+    Hook that aggregates the events of a run per stage: latency percentiles, tokens, cost,
+    retries and response-cache hits.
+    """
+
+    def __init__(self, prices=None):
+        """
+        Args:
+            prices (dict): Price table passed to estimate_cost; budget.MODEL_PRICES by default.
+        """
+        self.prices = prices
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Per stage, the number of calls, p50/p95 latency in seconds, tokens, cost,
+            retries, cache hits and misses and errors.
+        """
+        with self._lock:
+            events = list(self.events)
+        stages = {}
+        for event in events:
+            stages.setdefault(event["stage"] or "unstaged", []).append(event)
+        summary = {}
+        for stage, stage_events in sorted(stages.items()):
+            latencies = sorted(event["latency"] for event in stage_events)
+            summary[stage] = {
+                "calls": len(stage_events),
+                "p50_latency": round(_percentile(latencies, 0.50), 3),
+                "p95_latency": round(_percentile(latencies, 0.95), 3),
+                "prompt_tokens": sum(event["prompt_tokens"] for event in stage_events),
+                "completion_tokens": sum(event["completion_tokens"] for event in stage_events),
+                "cost": round(sum(estimate_cost(event["model"], event["prompt_tokens"], event["completion_tokens"],
+                                                event["cached_tokens"], self.prices) for event in stage_events), 6),
+                "retries": sum(event["retries"] for event in stage_events),
+                "cache_hits": sum(event["cache"] == "hit" for event in stage_events),
+                "cache_misses": sum(event["cache"] == "miss" for event in stage_events),
+                "errors": sum(event["error"] is not None for event in stage_events),
+            }
+        return summary
+
+    def report(self):
+        """
+        Return the summary as a text table.
+        """
+        lines = [f"{'stage':<40} {'calls':>5} {'p50 s':>7} {'p95 s':>7} {'tokens':>8} {'cost $':>9} "
+                 f"{'retries':>7} {'hits':>5}"]
+        for stage, metrics in self.summary().items():
+            lines.append(f"{stage:<40} {metrics['calls']:>5} {metrics['p50_latency']:>7.2f} "
+                         f"{metrics['p95_latency']:>7.2f} "
+                         f"{metrics['prompt_tokens'] + metrics['completion_tokens']:>8} {metrics['cost']:>9.4f} "
+                         f"{metrics['retries']:>7} {metrics['cache_hits']:>5}")
+        return "\n".join(lines)
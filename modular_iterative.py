@@ -1,8 +1,12 @@
-import pandas as pd
-import os
+import contextvars
 import json
+from concurrent.futures import ThreadPoolExecutor
 from ExtractCompanyNameJob import extract_company_name_and_job_name
-from format_combined_cv_with_prompt import format_combined_cv_with_prompt
+from format_combined_cv_with_prompt import format_combined_cv_with_prompt, is_template_compatible
+from parse_critique_to_dict import split_cv_critique_by_category
+from grade_log import GradeLog
+from budget import BudgetController
+from llm_events import llm_stage
 desired_structure_template = {
     "Name" : [],
     "Contact": {},
@@ -30,7 +34,8 @@ section_to_critique_mapping = {
     "Publications": ["Clarity and Structure"],
 }
 class ModularIterativeAgent:
-    def __init__(self, llm_client, max_iterations=4, improvement_threshold=-0.5):
+    def __init__(self, llm_client, max_iterations=4, improvement_threshold=-0.5, max_workers=1, formatter="llm",
+                 budget=None, grade_log=None):
         """
         Initialize the agent for iterative CV improvement using LLM.
 
@@ -38,10 +43,25 @@ class ModularIterativeAgent:
             llm_client: The client interface to interact with the LLM.
             max_iterations (int): The maximum number of iterations to improve the CV.
             improvement_threshold (float): The threshold for stopping improvement iterations.
+            max_workers (int): Number of sections improved concurrently; 1 improves them one by one.
+            formatter (str): "llm" (the default) always formats with the LLM; "local" renders the flat
+                CV with the Jinja2 template and only falls back to the LLM when the structure cannot
+                be rendered.
+            budget (BudgetController): Controller stopping improve_cv when the next round would
+                exceed its token, cost or time budget or is not expected to pay off; if None, an
+                unlimited one only reports the usage, cost and prompt-cache hit rate of each run.
+            grade_log (GradeLog): Log the critique grades are appended to; the default
+                Output/Grades/grades.sqlite if None.
         """
         self.llm_client = llm_client
         self.max_iterations = max_iterations
         self.improvement_threshold = improvement_threshold
+        self.max_workers = max_workers
+        if formatter not in ("local", "llm"):
+            raise ValueError(f"Unsupported formatter: {formatter}")
+        self.formatter = formatter
+        self.budget = budget if budget is not None else BudgetController()
+        self.grade_log = grade_log if grade_log is not None else GradeLog()
         self.history = []
         self.grades = []
 
@@ -101,6 +121,41 @@ class ModularIterativeAgent:
 
     import json
 
+    def format_cv(self, structured_cv):
+        """
+        Turn the structured CV into flat text with the configured formatter.
+
+        Args:
+            structured_cv (dict): A dictionary containing structured CV data.
+
+        Returns:
+            str: The formatted CV as a string.
+        """
+        if self.formatter == "local":
+            formatted_cv = self.format_cv_locally(structured_cv)
+            if formatted_cv is not None:
+                return formatted_cv
+            print("Local CV formatting failed, falling back to the LLM formatter.")
+        return self.format_cv_with_prompt_using_llm(structured_cv)
+
+    def format_cv_locally(self, structured_cv):
+        """
+        Render the structured CV with the local Jinja2 template, without an LLM call.
+
+        Args:
+            structured_cv (dict): A dictionary containing structured CV data.
+
+        Returns:
+            str: The formatted CV, or None if the structure does not fit the template.
+        """
+        if not is_template_compatible(structured_cv):
+            return None
+        # The formatter normalises some sections in place, so render a copy
+        formatted_cv = format_combined_cv_with_prompt(dict(structured_cv), verbose=False)
+        if formatted_cv.startswith("Error generating CV"):
+            return None
+        return formatted_cv
+
     def format_cv_with_prompt_using_llm(self,structured_cv):
         """
         Formats a structured CV dictionary into a professional CV using LLM prompts.
@@ -286,7 +341,10 @@ class ModularIterativeAgent:
 
     def critique_to_json(self, critique_text):
         """
-        Convert the critique text to a structured JSON format using LLM.
+        Convert the critique text to a structured JSON format.
+
+        The critique is split locally on its category headers; the LLM is only asked to
+        do the conversion when the headers are not all found.
 
         Args:
             critique_text (str): The raw critique text containing grades and actionable feedback.
@@ -295,6 +353,10 @@ class ModularIterativeAgent:
             dict: A structured dictionary with keys like 'Relevance to the Job', 'Clarity and Structure',
                   'Skills Presentation', 'Professionalism', and 'Overall'.
         """
+        categories = split_cv_critique_by_category(critique_text)
+        if categories is not None:
+            return categories
+        print("Critique headers not found, converting the critique with the LLM.")
         prompt = f"""
         Convert the following critique into a structured JSON format with the required keys and associated comments:
 
@@ -392,7 +454,34 @@ class ModularIterativeAgent:
             return content
 
 
-    def improve_cv(self, raw_cv, job_description_text, desired_structure = desired_structure_template):
+    def improve_sections(self, section_jobs, job_description_text):
+        """
+        Improve several sections, concurrently when max_workers > 1.
+
+        The section rewrites only depend on the critique of the current iteration, so they
+        are independent of each other. Results are returned in the order of ``section_jobs``
+        whatever order the calls complete in.
+
+        Args:
+            section_jobs (list): (section, content, critique) tuples.
+            job_description_text (str): The job description.
+
+        Returns:
+            list: The improved content of each section.
+        """
+        with llm_stage("improve_section"):
+            if self.max_workers <= 1 or len(section_jobs) <= 1:
+                return [self.improve_section(section, content, critique, job_description_text)
+                        for section, content, critique in section_jobs]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                # Each call runs in a copy of this context so its requests keep the stage label
+                futures = [pool.submit(contextvars.copy_context().run, self.improve_section, section, content,
+                                       critique, job_description_text)
+                           for section, content, critique in section_jobs]
+                return [future.result() for future in futures]
+
+    def improve_cv(self, raw_cv, job_description_text, desired_structure = desired_structure_template,
+                   company_name_and_job_name=None):
         """
         Perform iterative improvements on the CV.
 
@@ -400,53 +489,65 @@ class ModularIterativeAgent:
             raw_cv (str): The raw CV text.
             job_description_text (str): The job description.
             desired_structure (dict): The desired structure for the CV.
+            company_name_and_job_name (str): The 'Company|Job' string when already extracted by the caller.
 
         Returns:
             str: The final improved CV.
         """
+        self.budget.start(self.llm_client.ai_model, getattr(self.llm_client, "repair_model", None))
+        try:
+            return self._improve_cv(raw_cv, job_description_text, desired_structure, company_name_and_job_name)
+        finally:
+            self.budget.stop()
+            print("Budget summary:", self.budget.summary())
+
+    def _improve_cv(self, raw_cv, job_description_text, desired_structure, company_name_and_job_name):
         # Step 1: Parse the raw CV
         cv_content = raw_cv #self.llm_client.generate_cv(raw_cv, job_description_text, raw_cv, history=None)
-        structured_cv = self.parse_raw_cv(cv_content, desired_structure)
-        company_name_and_job_name = extract_company_name_and_job_name(job_description_text)
+        with llm_stage("parse"):
+            structured_cv = self.parse_raw_cv(cv_content, desired_structure)
+        if company_name_and_job_name is None:
+            company_name_and_job_name = extract_company_name_and_job_name(job_description_text,
+                                                                          self.llm_client.ai_model.api_key)
+        company_name_and_job_name = company_name_and_job_name.replace("/", "_").replace("|", "_")
 
         # Step 2: Iteratively improve the CV
         total_reward = 0
         previous_grade = 0
 
-        grades_names = ["Relevance to the Job", "Clarity and Structure", "Skills Presentation",
-                        "Professionalism", "Overall"]
-        grades_df = pd.DataFrame(columns=['iteration'] + grades_names)
+        run_id = self.grade_log.start_run(type(self).__name__, company_name_and_job_name)
 
         for iteration in range(self.max_iterations):
             # Format the current CV
-            combined_cv_flat = self.format_cv_with_prompt_using_llm(structured_cv)
+            with llm_stage("format"):
+                combined_cv_flat = self.format_cv(structured_cv)
 
             # Obtain critique and grade
             #critique, grade, grades_dict = self.generate_critique(combined_cv_flat, job_description_text)
-            critique_txt, grade, grades_dict = self.llm_client.create_critique(combined_cv_flat, raw_cv, job_description_text, history=self.history)
-            critique = self.critique_to_json(critique_txt)
+            with llm_stage("critique"):
+                # Sent without history so the static prompt prefix stays cacheable across iterations
+                critique_txt, grade, grades_dict = self.llm_client.create_critique(combined_cv_flat, raw_cv, job_description_text)
+                critique = self.critique_to_json(critique_txt)
             print("generated crotoque modular iterative")
             print("$"*100)
             print(critique)
             total_reward += grade
             self.grades.append(grade)
-
-            iteration_dict = {'iteration': iteration}
-
-            # Merge the dictionaries and convert to DataFrame
-            temp_df = pd.DataFrame({**iteration_dict, **grades_dict}, index=[0])
-
-            # Append to the main DataFrame
-            grades_df = pd.concat([grades_df, temp_df], ignore_index=True)
+            self.budget.record_grade(grade)
+            # Committed right away, so the grades survive whichever way the run ends
+            self.grade_log.log(run_id, iteration, grades_dict)
 
             # Early stopping conditions
             improvement = grade - previous_grade
             if improvement < self.improvement_threshold or grade >= 9:
-                grades_df.to_csv(os.path.join("Output", "Grades", company_name_and_job_name + "_ModularIterativeAgent_grades.csv"),
-                                 index=False)
+                break
+            reason = self.budget.stop_reason()
+            if reason:
+                print(f"Stopping after iteration {iteration + 1}: {reason}.")
                 break
 
             # Improve individual sections
+            section_jobs = []
             for section, content in structured_cv.items():
                 if section in section_to_critique_mapping.keys():
                     section_critique = "%s\n"%section
@@ -457,11 +558,13 @@ class ModularIterativeAgent:
                     print(relevant_critique)
                     print("&"*88)
                     if relevant_critique:
-                        improved_section = self.improve_section(section, content, relevant_critique, job_description_text)
-                        structured_cv[section] = improved_section
+                        section_jobs.append((section, content, relevant_critique))
+            improved_sections = self.improve_sections(section_jobs, job_description_text)
+            for (section, _, _), improved_section in zip(section_jobs, improved_sections):
+                structured_cv[section] = improved_section
 
             previous_grade = grade
 
         # Step 3: Final formatting
-        grades_df.to_csv(os.path.join("Output", "Grades", company_name_and_job_name + "_ModularIterativeAgent_grades.csv"), index=False)
-        return self.format_cv_with_prompt_using_llm(structured_cv), critique
\ No newline at end of file
+        with llm_stage("format"):
+            return self.format_cv(structured_cv), critique
\ No newline at end of file
@@ -69,6 +69,41 @@ def parse_cv_critique_to_dict(text,title, name):
     return critique_dict
 
 
+CV_CRITIQUE_CATEGORIES = ["Relevance to the Job", "Clarity and Structure", "Skills Presentation", "Professionalism",
+                          "Overall"]
+
+
+def split_cv_critique_by_category(text):
+    """
+    Splits CV critique text into the comments of each graded category, without an LLM call.
+
+    Relies on the fixed '**N. Category**' headers of the critique; the grade lines are dropped
+    and everything after the last header (the actionable feedback) stays with that section.
+
+    Args:
+        text (str): The critique text in a structured format.
+
+    Returns:
+        dict: The comments of each of CV_CRITIQUE_CATEGORIES, or None if a category header
+            is missing and the text cannot be split reliably.
+    """
+    if not text:
+        return None
+    sections = re.split(r"\*\*(\d+\.\s.*)\*\*", text)
+    categories = {}
+    for i in range(1, len(sections), 2):
+        section_title = sections[i].strip().lower()
+        for category in CV_CRITIQUE_CATEGORIES:
+            if category.lower() in section_title and category not in categories:
+                lines = [line.strip() for line in sections[i + 1].splitlines()]
+                categories[category] = "\n".join(
+                    line for line in lines if line and not line.lstrip("- ").startswith("Grade"))
+                break
+    if any(category not in categories for category in CV_CRITIQUE_CATEGORIES):
+        return None
+    return categories
+
+
 def generate_document_from_template(parsed_data, template_path, output_path):
     """
     Generates a Word document using the parsed critique data and a template.
@@ -1,6 +1,7 @@
 import logging
 import os,re
 from ai_interaction import OpenAIModel, CoverLetterGenerator
+from llm_events import LLMCall, openai_usage
 from basic_iterative import BasicIterativeAgent  # Import BasicIterativeAgent
 #from actor_critic import ActorCriticAgent  # Import ActorCriticAgent
 from data_handling import load_and_extract_text, extract_applicant_name
@@ -15,9 +16,16 @@ import json
 import logging
 
 class CVParserAI:
-    def __init__(self, client, model_name="gpt-4o-mini"):
+    def __init__(self, client, model_name="gpt-4o-mini", cache=None):
+        """
+        Args:
+            client: The OpenAI client.
+            model_name (str): The model used for parsing.
+            cache (LLMResponseCache): Optional response cache for low-temperature calls.
+        """
         self.client = client
         self.model_name = model_name
+        self.cache = cache
 
     def get_response(self, prompt, history=None, temperature=0.01):
         """
@@ -39,15 +47,28 @@ class CVParserAI:
 
         messages.append({"role": "user", "content": prompt})
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model_name, messages, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                LLMCall(self.model_name, cache="hit").finish()
+                return cached
+
+        call = LLMCall(self.model_name, cache=None if cache_key is None else "miss")
         try:
             completion = self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
                 temperature=temperature
             )
+            call.finish(*(openai_usage(completion) or ()))
             response = completion.choices[0].message.content.strip()
+            if cache_key is not None:
+                self.cache.set(cache_key, response, self.model_name)
             return response
         except Exception as e:
+            call.finish(error=e)
             logging.error(f"An error occurred: {e}")
             return None
 
@@ -0,0 +1,126 @@
+# pdf_text_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PDF_CACHE_PATH = os.path.join("Output", "Cache", "pdf_text.sqlite")
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    Return the SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PDFTextCache:
+    """
+    Disk-backed cache of the text extracted from PDF files, stored in SQLite.
+
+    Texts are keyed by the SHA-256 of the file content and the extractor version, so a
+    copy of the same CV under another name is a hit and upgrading the extractor is a
+    miss. Hashing a file still means reading it, so the hash of each path is remembered
+    with the file's mtime and size and only recomputed when either changes.
+    """
+
+    def __init__(self, path=DEFAULT_PDF_CACHE_PATH):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                sha256 TEXT
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                sha256 TEXT,
+                extractor TEXT,
+                text TEXT,
+                created_at REAL,
+                PRIMARY KEY (sha256, extractor)
+            )""")
+        self._conn.commit()
+
+    def content_hash(self, file_path):
+        """
+        Return the SHA-256 of a file, reusing the stored hash while its mtime and size are unchanged.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, size, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return row[2]
+        sha256 = file_sha256(path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files (path, mtime_ns, size, sha256) VALUES (?, ?, ?, ?)",
+                               (path, stat.st_mtime_ns, stat.st_size, sha256))
+            self._conn.commit()
+        return sha256
+
+    def get(self, sha256, extractor):
+        """
+        Return the cached text for a content hash and extractor version, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM texts WHERE sha256 = ? AND extractor = ?",
+                                     (sha256, extractor)).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, sha256, extractor, text):
+        """
+        Store the text extracted from a file.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts (sha256, extractor, text, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, extractor, text, time.time()))
+            self._conn.commit()
+
+    def get_or_extract(self, file_path, extractor, extract):
+        """
+        Return the text of a PDF from the cache, or extract and store it on a miss.
+
+        Args:
+            file_path (str): The path to the PDF file.
+            extractor (str): The extractor name and version the cached text must come from.
+            extract: Function extracting the text from a file path.
+
+        Returns:
+            str: The extracted text.
+        """
+        sha256 = self.content_hash(file_path)
+        text = self.get(sha256, extractor)
+        if text is not None:
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = extract(file_path)
+        self.set(sha256, extractor, text)
+        return text
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM texts")
+            self._conn.commit()
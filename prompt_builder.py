@@ -0,0 +1,53 @@
+# prompt_builder.py
+
+
+class PromptBuilder:
+    """
+    Assembles a prompt as a stable prefix followed by a variable suffix.
+
+    Providers cache the longest prefix of a request they have already seen, so the parts that
+    are the same in every iteration of a loop (instructions, original CV, job description) go
+    first and the parts that change (current CV, critique) go last. Adding a static part after
+    a variable one is an error, since it would end the shared prefix early.
+    """
+
+    def __init__(self, instructions=""):
+        """
+        Args:
+            instructions (str): The instructions opening the prompt.
+        """
+        self._static = [instructions.strip()] if instructions.strip() else []
+        self._variable = []
+
+    @staticmethod
+    def _part(title, text):
+        return f"**{title}**:\n{text}"
+
+    def static(self, title, text):
+        """
+        Add a part that does not change between the calls of a loop.
+        """
+        if self._variable:
+            raise ValueError(f"Static part '{title}' added after the variable parts.")
+        self._static.append(self._part(title, text))
+        return self
+
+    def variable(self, title, text):
+        """
+        Add a part that changes between the calls of a loop.
+        """
+        self._variable.append(self._part(title, text))
+        return self
+
+    @property
+    def prefix(self):
+        """
+        The stable part of the prompt.
+        """
+        return "\n\n".join(self._static)
+
+    def build(self):
+        """
+        Return the prompt.
+        """
+        return "\n\n".join(self._static + self._variable)
@@ -0,0 +1,95 @@
+# run_context.py
+import hashlib
+import threading
+
+from data_handling import load_and_extract_text
+from cv_info_extractor import extract_information_from_cv
+from ExtractCompanyNameJob import extract_company_name_and_job_name
+
+
+def clean_cv_data(cv_data):
+    """
+    Strip the quotes and commas the extraction model leaves around values.
+
+    Args:
+        cv_data (dict): The raw output of extract_information_from_cv.
+
+    Returns:
+        dict: The cleaned dictionary.
+    """
+    return {key.strip('"'): value.strip('"').replace(',', '').strip() if isinstance(value, str) else value for
+            key, value in cv_data.items()}
+
+
+class RunContext:
+    """
+    Per-run store of the artifacts shared by the stages of a CV generation run.
+
+    Each artifact is computed once per distinct input (keyed by a hash of the stage name
+    and its inputs) and then shared, so the PDF is parsed once and the extraction
+    prompts are sent once per run. Safe to use from concurrent stages: a second caller
+    waits for the first computation instead of repeating it.
+    """
+
+    def __init__(self, api_key, cache=None):
+        """
+        Args:
+            api_key (str): The OpenAI API key used by the extraction calls.
+            cache (LLMResponseCache): Optional response cache passed to the extraction calls.
+        """
+        self.api_key = api_key
+        self.cache = cache
+        self._artifacts = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, *inputs):
+        digest = hashlib.sha256()
+        for value in inputs:
+            digest.update(str(value).encode("utf-8"))
+            digest.update(b"\0")
+        return name, digest.hexdigest()
+
+    def memoize(self, name, inputs, compute):
+        """
+        Return the artifact ``name`` for ``inputs``, computing it on first request.
+
+        Args:
+            name (str): The artifact name.
+            inputs (tuple): The inputs the artifact depends on.
+            compute (callable): Zero-argument callable producing the artifact.
+
+        Returns:
+            The artifact.
+        """
+        key = self._key(name, *inputs)
+        with self._lock:
+            if key in self._artifacts:
+                return self._artifacts[key]
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._artifacts:
+                self._artifacts[key] = compute()
+            return self._artifacts[key]
+
+    def cv_text(self, cv_file_path):
+        """
+        The text of the CV PDF.
+        """
+        return self.memoize("cv_text", (cv_file_path,), lambda: load_and_extract_text(cv_file_path))
+
+    def cv_data(self, cv_text):
+        """
+        The cleaned personal information extracted from the CV text.
+        """
+        return self.memoize("cv_data", (cv_text,),
+                            lambda: clean_cv_data(extract_information_from_cv(cv_text, self.api_key)))
+
+    def company_name_and_job_name(self, job_description_text):
+        """
+        The 'Company|Job' string extracted from the job description, with '/' replaced by '_'.
+        """
+        return self.memoize("company_name_and_job_name", (job_description_text,),
+                            lambda: extract_company_name_and_job_name(job_description_text, self.api_key,
+                                                                      cache=self.cache).replace("/", "_"))
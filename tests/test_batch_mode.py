@@ -0,0 +1,168 @@
+import json
+
+import pytest
+
+from ai_interaction import LLMModel
+from batch_mode import (BatchLLMModel, BatchPendingError, LocalBatchEndpoint, batch_critique_cvs,
+                        run_batched_stage)
+
+
+class EchoModel(LLMModel):
+    """Model whose messages are the prompt alone; never called directly by the batch model."""
+
+    model_name = "echo"
+
+    def _build_messages(self, prompt, history=None):
+        return list(history or []) + [{"role": "user", "content": prompt}]
+
+    def get_response(self, prompt, history=None, temperature=0.7):
+        raise AssertionError("The batch model must not call the wrapped model.")
+
+
+def upper_responder(body):
+    return body["messages"][-1]["content"].upper()
+
+
+class PollingEndpoint(LocalBatchEndpoint):
+    """Local endpoint that reports a batch in progress for a few status checks."""
+
+    def __init__(self, responder, batch_dir, polls_before_done=2):
+        super().__init__(responder, batch_dir=batch_dir)
+        self.polls_before_done = polls_before_done
+        self.status_calls = 0
+
+    def status(self, batch_id):
+        self.status_calls += 1
+        if self.status_calls <= self.polls_before_done:
+            return "in_progress"
+        return super().status(batch_id)
+
+
+def test_get_response_queues_then_answers_after_ingest(tmp_path):
+    batch_model = BatchLLMModel(EchoModel())
+    with pytest.raises(BatchPendingError):
+        batch_model.get_response("hello", temperature=0.0)
+    # The same request is queued once
+    with pytest.raises(BatchPendingError):
+        batch_model.get_response("hello", temperature=0.0)
+    input_path = str(tmp_path / "requests.jsonl")
+    assert batch_model.write_batch_file(input_path) == 1
+    request = json.loads(open(input_path, encoding="utf-8").readline())
+    assert request["url"] == "/v1/chat/completions"
+    assert request["body"]["messages"] == [{"role": "user", "content": "hello"}]
+
+    endpoint = LocalBatchEndpoint(upper_responder, batch_dir=str(tmp_path))
+    batch_id = endpoint.submit(input_path)
+    assert endpoint.status(batch_id) == "completed"
+    output_path = endpoint.download(batch_id, str(tmp_path / "results.jsonl"))
+    assert batch_model.ingest_results(output_path) == 1
+    assert batch_model.get_response("hello", temperature=0.0) == "HELLO"
+    assert batch_model.pending == {}
+
+
+def test_run_batched_stage_polls_and_keeps_input_order(tmp_path):
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = PollingEndpoint(upper_responder, batch_dir=str(tmp_path), polls_before_done=2)
+
+    def stage(item):
+        # Two dependent calls: the second is only queued once the first is answered
+        first = batch_model.get_response(item, temperature=0.0)
+        return batch_model.get_response(first + "!", temperature=0.0)
+
+    items = ["c", "a", "b"]
+    results = run_batched_stage(stage, items, batch_model, endpoint, stage_name="order", batch_dir=str(tmp_path),
+                                poll_interval=0)
+    assert results == ["C!", "A!", "B!"]
+    # Status checked until completed, for each of the two rounds
+    assert endpoint.status_calls == 2 + 2
+
+
+def test_failed_items_are_resubmitted(tmp_path):
+    batch_model = BatchLLMModel(EchoModel())
+    failures = {"b": 1}
+
+    def flaky_responder(body):
+        content = body["messages"][-1]["content"]
+        if failures.get(content):
+            failures[content] -= 1
+            return None
+        return content.upper()
+
+    endpoint = LocalBatchEndpoint(flaky_responder, batch_dir=str(tmp_path))
+    results = run_batched_stage(lambda item: batch_model.get_response(item, temperature=0.0), ["a", "b"],
+                                batch_model, endpoint, stage_name="flaky", batch_dir=str(tmp_path), poll_interval=0)
+    assert results == ["A", "B"]
+
+
+def test_batch_without_usable_results_raises(tmp_path):
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = LocalBatchEndpoint(lambda body: None, batch_dir=str(tmp_path))
+    with pytest.raises(RuntimeError, match="no usable results"):
+        run_batched_stage(lambda item: batch_model.get_response(item, temperature=0.0), ["a"], batch_model,
+                          endpoint, stage_name="failed", batch_dir=str(tmp_path), poll_interval=0)
+
+
+def test_failed_batch_status_raises(tmp_path):
+    class FailedEndpoint(LocalBatchEndpoint):
+        def status(self, batch_id):
+            return "failed"
+
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = FailedEndpoint(upper_responder, batch_dir=str(tmp_path))
+    with pytest.raises(RuntimeError, match="status 'failed'"):
+        run_batched_stage(lambda item: batch_model.get_response(item, temperature=0.0), ["a"], batch_model,
+                          endpoint, stage_name="status", batch_dir=str(tmp_path), poll_interval=0)
+
+
+GRADED_CRITIQUE = "\n".join(f"#{name} Grade: {grade}#" for name, grade in [
+    ("Relevance to the Job", 7), ("Clarity and Structure", 8), ("Skills Presentation", 6),
+    ("Professionalism", 9), ("Reliability", 8), ("Overall", 7.5)])
+
+
+def test_batch_critique_cvs_returns_grades_in_order(tmp_path):
+    def critic(body):
+        prompt = body["messages"][-1]["content"]
+        return GRADED_CRITIQUE.replace("Overall Grade: 7.5", "Overall Grade: 9") if "second cv" in prompt \
+            else GRADED_CRITIQUE
+
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = LocalBatchEndpoint(critic, batch_dir=str(tmp_path))
+    items = [("first cv", "original", "job"), ("second cv", "original", "job")]
+    results = batch_critique_cvs(items, batch_model, endpoint, batch_dir=str(tmp_path), poll_interval=0)
+    assert [overall for _, overall, _ in results] == [7.5, 9.0]
+    assert results[0][2]["Relevance to the Job"] == 7.0
+
+
+def test_batch_critique_cvs_regenerates_a_rejected_critique(tmp_path):
+    critique_calls = []
+
+    def critic(body):
+        prompt = body["messages"][-1]["content"]
+        if prompt.startswith("The CV critique below is missing"):
+            return "no grades here"
+        critique_calls.append(prompt)
+        # The first critique misses a grade and its repair fails, so it must be regenerated
+        return GRADED_CRITIQUE.split("\n", 1)[1] if len(critique_calls) == 1 else GRADED_CRITIQUE
+
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = LocalBatchEndpoint(critic, batch_dir=str(tmp_path))
+    results = batch_critique_cvs([("cv", "original", "job")], batch_model, endpoint, batch_dir=str(tmp_path),
+                                 poll_interval=0)
+    assert len(critique_calls) == 2
+    assert results[0][2]["Relevance to the Job"] == 7.0
+
+
+def test_failing_item_is_recorded_without_losing_the_others(tmp_path):
+    batch_model = BatchLLMModel(EchoModel())
+    endpoint = LocalBatchEndpoint(upper_responder, batch_dir=str(tmp_path))
+
+    def stage(item):
+        response = batch_model.get_response(item, temperature=0.0)
+        if response == "BAD":
+            raise ValueError("Failed to extract Overall grade.")
+        return response
+
+    results = run_batched_stage(stage, ["a", "bad", "c"], batch_model, endpoint, stage_name="errors",
+                                batch_dir=str(tmp_path), poll_interval=0)
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
@@ -0,0 +1,36 @@
+from cv_info_extractor import extract_contact_info_locally
+
+
+def test_location_header_is_not_taken_as_the_name():
+    cv_text = """Tel Aviv
+Jane Doe
+jane.doe@gmail.com | +972 54-453-9284
+Summary
+Data scientist with eight years of experience."""
+    info = extract_contact_info_locally(cv_text)
+    assert info["Full name"] == "Jane Doe"
+    assert info["Email"] == "jane.doe@gmail.com"
+
+
+def test_name_matching_the_email_is_preferred():
+    # A city that is not in LOCATION_WORDS still loses to the line matching the email
+    cv_text = """Kfar Saba
+Noa Levi
+noalevi@mail.com"""
+    assert extract_contact_info_locally(cv_text)["Full name"] == "Noa Levi"
+
+
+def test_name_found_without_email():
+    cv_text = """Itay Ben-Dan
+Haarava 20, Herzliya
+Cellular: +972544539284"""
+    info = extract_contact_info_locally(cv_text)
+    assert info["Full name"] == "Itay Ben-Dan"
+    assert "Email" not in info
+
+
+def test_job_title_and_city_lines_are_not_names():
+    cv_text = """Senior Data Scientist
+New York
+Summary"""
+    assert "Full name" not in extract_contact_info_locally(cv_text)
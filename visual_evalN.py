@@ -18,7 +18,7 @@ from io import BytesIO
 from ai_interaction import OpenAIModel
 from typing import Tuple, Dict
 import base64
-import requests
+from http_clients import get_http_session, get_openai_client
 load_dotenv('.env', override=True)
 
 class ResumeEvaluator:
@@ -82,7 +82,7 @@ class ResumeEvaluator:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
         }
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+        response = get_http_session().post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
         if response.status_code != 200:
             raise ValueError(f"API request failed with status code {response.status_code}: {response.text}")
         json_response = response.json()
@@ -248,7 +248,7 @@ def main():
     if not openai_api_key:
         raise ValueError("OpenAI API key not found. Set it in the .env file.")
 
-    ai_model = OpenAI(api_key=openai_api_key)
+    ai_model = get_openai_client(openai_api_key)
     evaluator = ResumeEvaluator(ai_model, output_folder=os.path.join("Output", "VisualEval"))
 
     # Directory containing CV files
@@ -323,7 +323,7 @@ def main2(query):
     if not openai_api_key:
         raise ValueError("OpenAI API key not found. Set it in the .env file.")
 
-    ai_model = OpenAI(api_key=openai_api_key)
+    ai_model = get_openai_client(openai_api_key)
     evaluator = ResumeEvaluator(ai_model, output_folder=os.path.join("Output", "VisualEval"))
     #evaluator = ResumeEvaluator(ai_model, output_folder="Output/VisualEval")
     csv_path = "Output/VisualEval/cv_visual_evaluation.csv"